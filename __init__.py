@@ -1,130 +1,783 @@
 from __future__ import annotations
 
 import datetime as dt
+import time
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
-from homeassistant.const import CONF_IP_ADDRESS, CONF_NAME, Platform
-from .stm_device import STMDevice, APIError, ConnectionError, InvalidMethod
-from .const import DOMAIN, MANUFACTURER
+from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.const import CONF_IP_ADDRESS, CONF_NAME, CONF_PORT, Platform
+from .stm_device import STMDevice, APIError, ConnectionError, InvalidMethod, CircuitBreaker, PRIORITY_RECONCILE
+from .const import (
+    DOMAIN,
+    MANUFACTURER,
+    CONF_COALESCE_WINDOW,
+    DEFAULT_COALESCE_WINDOW,
+    CONF_FAST_INTERVAL,
+    DEFAULT_FAST_INTERVAL,
+    CONF_IDLE_INTERVAL,
+    DEFAULT_IDLE_INTERVAL,
+    CONF_BURST_DURATION,
+    DEFAULT_BURST_DURATION,
+    CONF_PUSH_PORT,
+    DEFAULT_PUSH_PORT,
+    CONF_METERS,
+    CONF_HOSTS,
+    CONF_MIGRATE_ENTRIES,
+    CONF_CAPTURE,
+    DEFAULT_CAPTURE,
+    CONF_DELTA_STATE,
+    DEFAULT_DELTA_STATE,
+    CONF_MAX_IN_FLIGHT,
+    DEFAULT_MAX_IN_FLIGHT,
+    CONF_ANALOG_SAMPLE_INTERVAL,
+    DEFAULT_ANALOG_SAMPLE_INTERVAL,
+    CONF_ANALOG_WINDOW,
+    DEFAULT_ANALOG_WINDOW,
+    CONF_BINARY_STATE,
+    DEFAULT_BINARY_STATE,
+    OPTIMISTIC_TIMEOUT,
+)
+from .push import async_register_push, parse_push_channels
+from .scheduler import PollScheduler, async_get_scheduler
+from .store import ControllerStore
+from .filters import PublishFilter
+from .meters import CounterTracker
+from .presses import PressDetector
+from .sampling import AnalogSampler
+from .capture import TrafficRecorder
+from .hub import HubCoordinator, async_migrate_into_hub, async_retry_unreachable, hub_store_key
+from .state import StateSnapshot, normalize_channel
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
-from typing import Any
+from typing import Any, Callable, Mapping
+import asyncio
 from asyncio import timeout, TimeoutError
 import logging
+from homeassistant.helpers import device_registry as dr, entity_registry as er
 from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_time_interval
 
 _LOGGER = logging.getLogger(__name__)
 PLATFORMS = [Platform.SENSOR, Platform.SWITCH, Platform.BUTTON, Platform.BINARY_SENSOR, Platform.NUMBER,
-             Platform.DATETIME, Platform.LIGHT]
+             Platform.DATETIME, Platform.LIGHT, Platform.EVENT]
+# changes in these categories mean someone is interacting with the controller
+ACTIVITY_CATEGORIES = {"relay", "light", "v_switch", "v_numeric", "button", "button_long", "binary_sensor",
+                       "v_binary_sensor", "button_seq", "button_long_seq"}
+# boot time drift tolerated before a controller is considered rebooted while HA was down
+REBOOT_TOLERANCE = dt.timedelta(seconds=30)
+# consecutive failed polls answered with the last state before the entities become unavailable
+STALE_POLL_LIMIT = 3
+# channels the controller forgets on reboot, in the order they are restored
+RESTORE_CATEGORIES = ("v_numeric", "v_switch", "relay", "light")
+# builds the entities of a platform for a controller from its system_info
+EntityFactory = Callable[["STMDeviceDataUpdateCoordinator", ConfigEntry], list[Entity]]
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    device = STMDevice(entry.data[CONF_IP_ADDRESS])
-    coordinator = STMDeviceDataUpdateCoordinator(hass, device, await device.ip_address, await device.version)
-    await coordinator.async_config_entry_first_refresh()
+    if CONF_HOSTS in entry.data:
+        return await _async_setup_hub_entry(hass, entry)
+    coordinator = await _async_create_coordinator(hass, entry, entry.data[CONF_IP_ADDRESS],
+                                                  entry.data.get(CONF_PORT, 80), entry.entry_id)
+    if coordinator.system_info is None:
+        try:
+            await coordinator.async_config_entry_first_refresh()
+        except Exception:
+            await coordinator.device.close()
+            raise
     entry.async_on_unload(entry.add_update_listener(update_listener))
+    entry.async_on_unload(async_get_scheduler(hass).register(coordinator))
+    await _async_register_push(hass, entry, coordinator)
     hass.data.setdefault(DOMAIN, {})[entry.entry_id] = coordinator
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    # entities have seeded the desired state from their restored state by now
+    coordinator.desired_ready = True
+    entry.async_on_unload(coordinator.async_start_sampling())
+    return True
+
+
+async def _async_setup_hub_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Set up all controllers of a hub entry, polled by one HubCoordinator."""
+    if migrate := entry.data.get(CONF_MIGRATE_ENTRIES):
+        await async_migrate_into_hub(hass, entry, migrate)
+        hass.config_entries.async_update_entry(
+            entry, data={key: value for key, value in entry.data.items() if key != CONF_MIGRATE_ENTRIES})
+    hub = HubCoordinator(hass, entry.title)
+    children = await asyncio.gather(*(
+        _async_create_coordinator(hass, entry, host[CONF_IP_ADDRESS], host.get(CONF_PORT, 80),
+                                  hub_store_key(entry.entry_id, host[CONF_IP_ADDRESS]))
+        for host in entry.data[CONF_HOSTS]))
+    # controllers without cached system_info need a first poll to build their entities
+    await asyncio.gather(*(child.async_refresh() for child in children if child.system_info is None))
+    unreachable = []
+    for child in children:
+        if child.system_info is None:
+            _LOGGER.warning(f"Controller {child.ip_address} of {entry.title} is unreachable, "
+                            f"it is added once it answers")
+            unreachable.append(child)
+            continue
+        hub.add(child)
+    if not hub.coordinators:
+        for child in unreachable:
+            await child.device.close()
+        raise ConfigEntryNotReady(f"No controller of {entry.title} is reachable")
+    if unreachable:
+        entry.async_on_unload(async_retry_unreachable(hass, entry, unreachable))
+    hub.data = {}
+    entry.async_on_unload(entry.add_update_listener(update_listener))
+    # the hub is polled by the scheduler, the controllers report their activity to the hub
+    entry.async_on_unload(async_get_scheduler(hass).register(hub))
+    for child in hub.coordinators.values():
+        await _async_register_push(hass, entry, child)
+    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = hub
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    for child in hub.coordinators.values():
+        child.desired_ready = True
+        entry.async_on_unload(child.async_start_sampling())
     return True
 
 
+async def _async_create_coordinator(hass: HomeAssistant, entry: ConfigEntry, ip_address: str, port: int,
+                                    store_key: str) -> STMDeviceDataUpdateCoordinator:
+    """Coordinator of one controller, with system_info from the cache when there is one."""
+    device = STMDevice(ip_address, port=port,
+                       max_connections=entry.options.get(CONF_MAX_IN_FLIGHT, DEFAULT_MAX_IN_FLIGHT),
+                       coalesce_window=entry.options.get(CONF_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW),
+                       delta_state=entry.options.get(CONF_DELTA_STATE, DEFAULT_DELTA_STATE),
+                       binary_state=entry.options.get(CONF_BINARY_STATE, DEFAULT_BINARY_STATE))
+    if entry.options.get(CONF_CAPTURE, DEFAULT_CAPTURE):
+        device.recorder = TrafficRecorder(hass.config.path(f"{DOMAIN}.{store_key}.capture.jsonl"))
+    store = ControllerStore(hass, store_key)
+    await store.async_load()
+    coordinator = STMDeviceDataUpdateCoordinator(hass, device, await device.ip_address, None, entry.options, store)
+    if store.system_info:
+        # build the platforms from the cache, the scheduler does the first poll
+        coordinator.set_system_info(store.system_info)
+        coordinator.data = StateSnapshot()
+    return coordinator
+
+
+async def _async_register_push(hass: HomeAssistant, entry: ConfigEntry,
+                               coordinator: STMDeviceDataUpdateCoordinator) -> None:
+    if push_port := entry.options.get(CONF_PUSH_PORT, DEFAULT_PUSH_PORT):
+        try:
+            entry.async_on_unload(await async_register_push(hass, push_port, coordinator))
+        except OSError as error:
+            _LOGGER.error(f"Unable to listen for push on UDP port {push_port}, polling only: {error}")
+
+
+@callback
+def entry_coordinators(hass: HomeAssistant, entry: ConfigEntry) -> list[STMDeviceDataUpdateCoordinator]:
+    """Controller coordinators of an entry, one for a single controller entry, all of a hub."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    if isinstance(coordinator, HubCoordinator):
+        return list(coordinator.coordinators.values())
+    return [coordinator]
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
+        coordinators = entry_coordinators(hass, entry)
         hass.data[DOMAIN].pop(entry.entry_id)
+        for coordinator in coordinators:
+            await coordinator.device.close()
     return unload_ok
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove persisted data of a deleted entry."""
+    if CONF_HOSTS in entry.data:
+        for host in entry.data[CONF_HOSTS]:
+            await ControllerStore(hass, hub_store_key(entry.entry_id, host[CONF_IP_ADDRESS])).async_remove()
+        return
+    await ControllerStore(hass, entry.entry_id).async_remove()
+
+
 async def update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Update listener."""
     await hass.config_entries.async_reload(entry.entry_id)
 
 
 class STMDeviceDataUpdateCoordinator(
-    DataUpdateCoordinator[dict[str, Any]]):  # pylint: disable=hass-enforce-coordinator-module
+    DataUpdateCoordinator[StateSnapshot]):  # pylint: disable=hass-enforce-coordinator-module
     """Class to manage fetching data API."""
 
-    def __init__(self, hass: HomeAssistant, device: STMDevice, ip_address: str, version: int | None) -> None:
+    def __init__(self, hass: HomeAssistant, device: STMDevice, ip_address: str, version: int | None,
+                 options: Mapping[str, Any] | None = None, store: ControllerStore | None = None) -> None:
         """Initialize."""
         self.device = device
+        self.store = store
         self.device_info = DeviceInfo(
             identifiers={(DOMAIN, ip_address)},
             manufacturer=MANUFACTURER,
             name=f"Controller_{ip_address.split('.')[-2]}_{ip_address.split('.')[-1]}",
             sw_version=version,
         )
-        self.state = {}
+        self.state = StateSnapshot()
         self.system_info = None
         self.ip_address = ip_address
         self.connection_error = False
         self.seconds_since_start = 0
         self.works_since = None
-        update_interval = dt.timedelta(seconds=2)
+        self._changed_channels: set[tuple[str, Any]] | None = None
+        self._notified_success: bool | None = None
+        self._optimistic: dict[tuple[str, int], tuple[Any, float]] = {}
+        options = options or {}
+        self._options = options
+        self._fast_interval = options.get(CONF_FAST_INTERVAL, DEFAULT_FAST_INTERVAL) / 1000
+        self._idle_interval = max(self._fast_interval, options.get(CONF_IDLE_INTERVAL, DEFAULT_IDLE_INTERVAL))
+        self._burst_duration = options.get(CONF_BURST_DURATION, DEFAULT_BURST_DURATION)
+        self._burst_until = 0.0
+        self.poll_interval = min(max(2.0, self._fast_interval), self._idle_interval)
+
+        # polls are driven by the shared PollScheduler, not by a timer per coordinator
+        self.scheduler: PollScheduler | None = None
+        # desired state per category as {"1": value}, updated by commands and by changes seen on the controller
+        self._desired: dict[str, dict[str, Any]] = store.data.setdefault("desired", {}) if store is not None else {}
+        self.desired_ready = False
+        self._restore_pending = False
+        self._reconcile_task: asyncio.Task | None = None
+        self._breaker_state = CircuitBreaker.CLOSED
+        self._failed_polls = 0
+        self._last_poll_started: float | None = None
+        self._last_poll_interval = self.poll_interval
+        # deadband filters of noisy sensor channels by listener context
+        self._filters: dict[tuple[str, Any], PublishFilter] = {}
+        # filtered channels whose current value was held back
+        self._filter_pending: set[tuple[str, Any]] = set()
+        # totals and rates of the counters by index
+        self.meters: dict[int, CounterTracker] = {}
+        self._presses = PressDetector()
+        # ring buffer of high-rate analog samples and the aggregates of the last window, None when off
+        self._sample_interval = options.get(CONF_ANALOG_SAMPLE_INTERVAL, DEFAULT_ANALOG_SAMPLE_INTERVAL) / 1000
+        self.sampler: AnalogSampler | None = AnalogSampler.for_interval(
+            options.get(CONF_ANALOG_WINDOW, DEFAULT_ANALOG_WINDOW), self._sample_interval
+        ) if self._sample_interval else None
+        self.analog_stats: dict[int, dict[str, float]] = {}
+        self._sample_task: asyncio.Task | None = None
+        self._press_callbacks: dict[int, list[Callable[[str, dict[str, Any]], None]]] = {}
+        # entity factories of the platforms and the unique IDs they created, to follow system_info changes
+        self._entity_factories: list[tuple[ConfigEntry, Platform, EntityFactory, AddEntitiesCallback]] = []
+        self._unique_ids: dict[Platform, set[str]] = {}
+        # temperature probes in the last snapshot, a new set revalidates system_info
+        self._probes_seen: frozenset[str] = frozenset()
 
-        super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=update_interval)
+        super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=None)
 
-    async def _async_update_data(self) -> dict[str, Any]:
+    async def _async_update_data(self) -> StateSnapshot:
         """Update data via library."""
+        started = time.perf_counter()
+        now = time.monotonic()
+        jitter = None
+        if self._last_poll_started is not None:
+            jitter = now - self._last_poll_started - self._last_poll_interval
+        self._last_poll_started = now
+        self._last_poll_interval = self.poll_interval
         try:
             async with timeout(5):
                 if not self.system_info:
-                    self.system_info = await self.device.system_info
+                    self.set_system_info(await self.device.system_info)
                 current = await self.device.state
         except (APIError, ConnectionError, InvalidMethod, TimeoutError) as error:
-            _LOGGER.warning(f"Unable to fetch data from {self.ip_address}.")
+            breaker_changed = self._breaker_changed()
+            self._failed_polls += 1
+            breaker_closed = self.device.breaker.state == CircuitBreaker.CLOSED
+            if breaker_closed and self.data is not None and self._failed_polls <= STALE_POLL_LIMIT:
+                # a single lost poll on a flaky link does not make the entities unavailable
+                _LOGGER.debug(f"Unable to fetch data from {self.ip_address}, keeping last state: {error}")
+                self._changed_channels = set()
+                return self.data
+            if breaker_changed and self.device.breaker.state == CircuitBreaker.OPEN:
+                _LOGGER.warning(f"Unable to fetch data from {self.ip_address}, retrying with backoff.")
+            elif breaker_closed and self._failed_polls == STALE_POLL_LIMIT + 1:
+                # the controller answers, but with errors
+                _LOGGER.warning(f"Unable to fetch data from {self.ip_address} "
+                                f"after {self._failed_polls} attempts: {error}")
+            self._changed_channels = {("breaker", None)} if breaker_changed else None
             raise UpdateFailed(error) from error
-        _LOGGER.info(f"Loaded data: {current}")
+        if breaker_changed := self._breaker_changed():
+            _LOGGER.info(f"{self.ip_address} is reachable again")
+        # polls failed since the last snapshot, also those answered with the last state
+        resumed = self._failed_polls > 0 or not self.last_update_success
+        self._failed_polls = 0
+        _LOGGER.info("Loaded data: %s", current)
 
+        previous_works_since = self.works_since
+        rebooted = False
         # check seconds_since_start
-        if "up" in current:
-            seconds_since_start = int(current["up"])
+        if current.up is not None:
+            seconds_since_start = current.up
+            booted = dt.datetime.now(dt.UTC) - dt.timedelta(seconds=seconds_since_start)
 
             if not self.works_since:
-                self.works_since = dt.datetime.now(dt.UTC) - dt.timedelta(
-                    seconds=seconds_since_start)
-
-            if seconds_since_start < self.seconds_since_start:
-                # device restarted, need restoring state
-                await self.restore_controller_state()
-                self.works_since = dt.datetime.now(dt.UTC) - dt.timedelta(
-                    seconds=seconds_since_start)
+                self.works_since = booted
+                if self.store is None or self._rebooted_since_stored():
+                    # rebooted (maybe flashed) while HA was down
+                    rebooted = True
+                    self._restore_pending = True
+                    self.device.metrics.reboots += 1
+                    if self.store is not None:
+                        self._async_revalidate_system_info()
+            elif seconds_since_start < self.seconds_since_start or (
+                    resumed and abs(booted - self.works_since) > REBOOT_TOLERANCE):
+                # device restarted, also while it was unreachable, need restoring state
+                rebooted = True
+                self.works_since = booted
+                self._restore_pending = True
+                self.device.metrics.reboots += 1
+                self._async_revalidate_system_info()
 
             self.seconds_since_start = seconds_since_start
+            if self.store is not None:
+                self.store.async_set_works_since(self.works_since.isoformat())
+
+        if current.temperature.keys() != self._probes_seen:
+            # a probe plugged in or out without a reboot
+            self._probes_seen = frozenset(current.temperature)
+            known = (self.system_info or {}).get("temperature", {}).get("addr", [])
+            if self._probes_seen != {str(addr) for addr in known}:
+                self._async_revalidate_system_info()
+
+        if self.desired_ready:
+            self._reconcile_desired(current)
+        self._overlay_optimistic(current)
+        meters_changed = self._update_meters(current, rebooted)
+        sampled = self._sample_analog(current)
+        self._dispatch_presses(self.data, current, resync=rebooted or resumed)
+        if self.data is not None:
+            changed = current.diff(self.data) | meters_changed | sampled
+            if self.works_since != previous_works_since:
+                changed.add(("works_since", None))
+            if breaker_changed:
+                changed.add(("breaker", None))
+            changed.add(("metrics", None))
+            self._changed_channels = changed
+            self._adapt_poll_interval(
+                any(category in ACTIVITY_CATEGORIES for category, _ in changed)
+                or bool(current.button or current.button_long))
         self.state = current
+        self.device.metrics.record_poll(time.perf_counter() - started, jitter)
         return current
 
-    async def restore_controller_state(self):
-        _LOGGER.warning((f"Restoring {await self.device.ip_address} to {self.state}"))
-        if "v_numeric" in self.state:
-            i = 1
-            params = {}
-            for value in self.state["v_numeric"]:
-                params[f"{i}"] = int(value)
-                i += 1
-            await self.device.api_request("v_numeric", "POST", params)
-
-        if "v_switch" in self.state:
-            i = 1
-            params = {}
-            for value in self.state["v_switch"]:
-                params[f"{i}"] = int(value)
-                i += 1
-            await self.device.api_request("v_switch", "POST", params)
-
-        if "relay" in self.state:
-            i = 1
-            params = {}
-            for value in self.state["relay"]:
-                params[f"{i}"] = int(value)
-                i += 1
-            await self.device.api_request("relay", "POST", params)
-
-        if "light" in self.state:
-            i = 1
-            params = {}
-            for value in self.state["light"]:
-                params[f"{i}"] = int(value)
-                i += 1
-            await self.device.api_request("light", "POST", params)
+    def _reconcile_desired(self, current: StateSnapshot) -> None:
+        """Compare the desired state with a polled snapshot.
+
+        After a reboot the channels that differ are sent back to the
+        controller, otherwise the controller is authoritative and changes made
+        on it (wall buttons, local logic) are taken over into the desired state.
+        """
+        if self._reconcile_task is not None and not self._reconcile_task.done():
+            # restore requests are in flight, the polled values are not authoritative yet
+            return
+        restore = self._restore_pending
+        self._restore_pending = False
+        to_send: dict[str, dict[str, Any]] = {}
+        updated = False
+        for category in RESTORE_CATEGORIES:
+            live = current.values(category)
+            if live is None:
+                continue
+            desired = self._desired.setdefault(category, {})
+            for i, value in enumerate(live):
+                idx = f"{i + 1}"
+                if value is None or (category, i + 1) in self._optimistic or desired.get(idx) == value:
+                    continue
+                if restore and idx in desired:
+                    to_send.setdefault(category, {})[idx] = desired[idx]
+                else:
+                    desired[idx] = int(value)
+                    updated = True
+        if updated and self.store is not None:
+            self.store.async_save()
+        if to_send:
+            self._reconcile_task = self.hass.async_create_background_task(
+                self._async_send_desired(to_send), f"{DOMAIN} restore {self.ip_address}")
+
+    async def _async_send_desired(self, to_send: dict[str, dict[str, Any]]) -> None:
+        """Send differing channels, one merged request per endpoint."""
+        _LOGGER.warning(f"Restoring {self.ip_address} to {to_send}")
+        self.device.metrics.restores += 1
+        for category in RESTORE_CATEGORIES:
+            if category not in to_send:
+                continue
+            try:
+                await self.device.api_request(category, "POST", to_send[category], PRIORITY_RECONCILE)
+            except (APIError, ConnectionError, InvalidMethod) as error:
+                _LOGGER.warning(f"Unable to restore {category} of {self.ip_address}: {error}")
+                # retried on the next poll
+                self._restore_pending = True
+                continue
+            self._apply_channels({(category, int(idx)): value for idx, value in to_send[category].items()})
+
+    def _update_meters(self, current: StateSnapshot, rebooted: bool = False) -> set[tuple[str, Any]]:
+        """Feed the polled counters to their trackers, return the keys of changed totals and rates."""
+        changed = set()
+        counters = current.values("counter")
+        if not counters:
+            return changed
+        options = self._options.get(CONF_METERS, {})
+        stored = self.store.data.setdefault("meters", {}) if self.store is not None else {}
+        for idx, raw in enumerate(counters, 1):
+            if (tracker := self.meters.get(idx)) is None:
+                tracker = self.meters[idx] = CounterTracker.from_options(options.get(f"{idx}"), stored.get(f"{idx}"))
+            total, rate, last_raw = tracker.total, tracker.rate, tracker.last_raw
+            tracker.update(raw, current.up, rebooted)
+            if tracker.total != total:
+                changed.add(("counter", idx))
+            if tracker.rate != rate:
+                changed.add(("counter_rate", idx))
+            if tracker.last_raw != last_raw and self.store is not None:
+                stored[f"{idx}"] = tracker.as_dict()
+                self.store.async_save()
+        return changed
+
+    @callback
+    def async_subscribe_presses(self, idx: int,
+                                press_callback: Callable[[str, dict[str, Any]], None]) -> CALLBACK_TYPE:
+        """Call press_callback(event type, attributes) on every press of button idx."""
+        callbacks = self._press_callbacks.setdefault(idx, [])
+        callbacks.append(press_callback)
+
+        @callback
+        def unsubscribe() -> None:
+            callbacks.remove(press_callback)
+
+        return unsubscribe
+
+    def _dispatch_presses(self, previous: StateSnapshot | None, current: StateSnapshot,
+                          resync: bool = False) -> None:
+        for idx, event_type, attributes in self._presses.detect(previous, current, resync):
+            for press_callback in self._press_callbacks.get(idx, ()):
+                press_callback(event_type, attributes)
+
+    @callback
+    def async_seed_desired(self, category: str, idx: int, value: Any) -> None:
+        """Use a restored entity state for channels without a persisted desired value."""
+        desired = self._desired.setdefault(category, {})
+        if f"{idx}" not in desired:
+            desired[f"{idx}"] = value
+            if self.store is not None:
+                self.store.async_save()
+
+    def _breaker_changed(self) -> bool:
+        """Check whether the breaker state changed since the last poll."""
+        state = self.device.breaker.state
+        changed = state != self._breaker_state
+        self._breaker_state = state
+        return changed
+
+    def set_system_info(self, system_info: dict[str, Any]) -> None:
+        """Use system_info for the entities and keep it in the persistent cache."""
+        self.system_info = system_info
+        self.device.use_system_info(system_info)
+        self.device_info["sw_version"] = system_info.get("version", 0)
+        if self.store is not None:
+            self.store.async_set_system_info(system_info)
+
+    def _rebooted_since_stored(self) -> bool:
+        if not self.store.works_since:
+            return True
+        stored = dt.datetime.fromisoformat(self.store.works_since)
+        return abs(self.works_since - stored) > REBOOT_TOLERANCE
+
+    @callback
+    def async_start_sampling(self) -> CALLBACK_TYPE:
+        """Sample the analog inputs every sample interval between the polls, returns a callback to stop."""
+        if self.sampler is None:
+            return lambda: None
+        return async_track_time_interval(self.hass, self._async_sample_tick,
+                                         dt.timedelta(seconds=self._sample_interval))
+
+    @callback
+    def _async_sample_tick(self, _now: dt.datetime) -> None:
+        if self._sample_task is not None and not self._sample_task.done():
+            # the controller answers slower than the interval, skip a sample
+            return
+        if self.device.breaker.state != CircuitBreaker.CLOSED:
+            return
+        self._sample_task = self.hass.async_create_background_task(
+            self._async_sample(), f"{DOMAIN} sample {self.ip_address}")
+
+    async def _async_sample(self) -> None:
+        try:
+            async with timeout(5):
+                current = await self.device.state
+        except (APIError, ConnectionError, InvalidMethod, TimeoutError) as error:
+            # availability is up to the polls
+            _LOGGER.debug(f"Unable to sample {self.ip_address}: {error}")
+            return
+        if changed := self._sample_analog(current):
+            self._changed_channels = changed
+            self.async_update_listeners()
+
+    def _sample_analog(self, current: StateSnapshot) -> set[tuple[str, Any]]:
+        """Buffer the analog inputs, the listener contexts of new aggregates once a window is complete."""
+        if self.sampler is None:
+            return set()
+        now = time.monotonic()
+        if not any(category == "analog_in" for category, _ in current.invalid):
+            # a sample with a channel that is not a number would skew the window
+            self.sampler.add(current.analog_in, now)
+        if not self.sampler.due(now):
+            return set()
+        self.analog_stats = self.sampler.aggregate(now)
+        return {("analog_stats", idx) for idx in self.analog_stats}
+
+    @callback
+    def async_add_entity_factory(self, entry: ConfigEntry, platform: Platform, factory: EntityFactory,
+                                 async_add_entities: AddEntitiesCallback) -> None:
+        """Add the entities a platform builds from system_info, again for channels added later."""
+        self._entity_factories.append((entry, platform, factory, async_add_entities))
+        entities = factory(self, entry)
+        self._unique_ids[platform] = {entity.unique_id for entity in entities}
+        async_add_entities(entities)
+
+    @callback
+    def _async_reconcile_entities(self) -> None:
+        """Add the entities of new channels and remove those of vanished ones.
+
+        Entities whose unique ID is still built from the new system_info are
+        kept as they are, with their state and listeners.
+        """
+        entity_registry = er.async_get(self.hass)
+        for entry, platform, factory, async_add_entities in self._entity_factories:
+            entities = factory(self, entry)
+            known = self._unique_ids.get(platform, set())
+            current = {entity.unique_id for entity in entities}
+            if added := [entity for entity in entities if entity.unique_id not in known]:
+                _LOGGER.info(f"Adding {len(added)} {platform} entities of {self.ip_address}")
+                async_add_entities(added)
+            for unique_id in known - current:
+                # removing the registry entry also removes the entity from hass
+                if entity_id := entity_registry.async_get_entity_id(platform, DOMAIN, unique_id):
+                    _LOGGER.info(f"Removing {entity_id}, its channel is gone from {self.ip_address}")
+                    entity_registry.async_remove(entity_id)
+            self._unique_ids[platform] = current
+
+    @callback
+    def _async_revalidate_system_info(self) -> None:
+        self.hass.async_create_background_task(
+            self._async_revalidate(), f"{DOMAIN} system_info {self.ip_address}")
+
+    async def _async_revalidate(self) -> None:
+        """Refetch system_info and follow the controller's changes without reloading the entry."""
+        try:
+            async with timeout(5):
+                system_info = await self.device.system_info
+        except (APIError, ConnectionError, InvalidMethod, TimeoutError) as error:
+            _LOGGER.debug(f"Unable to revalidate system_info of {self.ip_address}: {error}")
+            return
+        if system_info == self.system_info:
+            return
+        _LOGGER.info(f"System info of {self.ip_address} changed")
+        self.set_system_info(system_info)
+        device_registry = dr.async_get(self.hass)
+        if device := device_registry.async_get_device(identifiers=self.device_info["identifiers"]):
+            device_registry.async_update_device(device.id, sw_version=self.device_info["sw_version"])
+        self._async_reconcile_entities()
+
+    @callback
+    def async_handle_push(self, payload: dict[str, Any]) -> None:
+        """Apply channels pushed by the controller right away.
+
+        Polling keeps running and reconciles anything a lost datagram missed.
+        """
+        values = {key: value for key, value in parse_push_channels(payload).items() if key not in self._optimistic}
+        self._apply_channels(values)
+        self._note_activity()
+
+    def _note_activity(self) -> None:
+        """Switch to the fast poll interval for the burst period."""
+        self._burst_until = time.monotonic() + self._burst_duration
+        if self.poll_interval != self._fast_interval:
+            self.poll_interval = self._fast_interval
+            if self.scheduler is not None:
+                # bring the pending (slow) poll forward
+                self.scheduler.poll_soon(self)
+
+    def _adapt_poll_interval(self, active: bool) -> None:
+        """Go fast on activity, decay back towards the idle interval after the burst."""
+        if active:
+            self._note_activity()
+        elif time.monotonic() >= self._burst_until and self.poll_interval < self._idle_interval:
+            self.poll_interval = min(self._idle_interval, self.poll_interval * 2)
+
+    def _overlay_optimistic(self, current: StateSnapshot) -> None:
+        """Keep unconfirmed command values on top of a fresh snapshot.
+
+        A value is dropped once the controller reports it, or rolled back to
+        the polled value when it is not confirmed within OPTIMISTIC_TIMEOUT.
+        """
+        now = time.monotonic()
+        for (category, idx), (value, deadline) in list(self._optimistic.items()):
+            polled = current.get(category, idx)
+            if polled is None:
+                self._optimistic.pop((category, idx))
+                continue
+            if polled == value:
+                self._optimistic.pop((category, idx))
+            elif now > deadline:
+                _LOGGER.debug(f"{self.ip_address}: {category}[{idx}] not confirmed, rolling back")
+                self._optimistic.pop((category, idx))
+            else:
+                current.set(category, idx, value)
+
+    async def async_write_channel(self, category: str, idx: int, value: Any) -> None:
+        """Send a command and apply its result to the coordinator data immediately.
+
+        The channel is set optimistically before the request, replaced by the
+        state echoed in the response if the firmware returns one, and rolled
+        back if the request fails.
+        """
+        key = (category, idx)
+        previous = self.data.get(category, idx) if self.data is not None else None
+        token = (normalize_channel(category, value), time.monotonic() + OPTIMISTIC_TIMEOUT)
+        self._optimistic[key] = token
+        self._apply_channels({key: value})
+        self._note_activity()
+        try:
+            response = await self.device.write_channel(category, idx, value)
+        except Exception:
+            if self._optimistic.get(key) is token:
+                self._optimistic.pop(key)
+                self._apply_channels({key: previous})
+            raise
+        echoed = {}
+        if isinstance(response, dict):
+            for echoed_category, values in response.items():
+                if isinstance(values, list):
+                    for i, echoed_value in enumerate(values):
+                        echoed[(echoed_category, i + 1)] = echoed_value
+        if key in echoed:
+            if self._optimistic.get(key) is token:
+                # confirmed by the controller
+                self._optimistic.pop(key)
+            else:
+                # a newer write of this channel is in flight, its value stays
+                echoed.pop(key)
+        # channels with their own command in flight keep their optimistic value and rollback token
+        echoed = {echoed_key: echoed_value for echoed_key, echoed_value in echoed.items()
+                  if echoed_key not in self._optimistic}
+        if echoed:
+            self._apply_channels(echoed)
+        if category in RESTORE_CATEGORIES:
+            self._desired.setdefault(category, {})[f"{idx}"] = value
+            if self.store is not None:
+                self.store.async_save()
+
+    @callback
+    def _apply_channels(self, values: dict[tuple[str, int], Any]) -> None:
+        """Merge channel values into the current data and notify their entities."""
+        if self.data is None:
+            return
+        data = self.data.copy()
+        changed = set()
+        for (category, idx), value in values.items():
+            previous = data.get(category, idx)
+            if previous is None:
+                continue
+            if previous != normalize_channel(category, value):
+                data.set(category, idx, value)
+                changed.add((category, idx))
+        if not changed:
+            return
+        self._dispatch_presses(self.data, data)
+        self.data = data
+        self.state = data
+        self._changed_channels = changed
+        self.async_update_listeners()
+
+    @callback
+    def async_set_publish_filter(self, context: tuple[str, Any],
+                                 entity_options: Mapping[str, Any] | None = None) -> None:
+        """Filter the updates of a sensor channel with the entry options, overridden per entity."""
+        publish_filter = PublishFilter.from_options(self._options, entity_options)
+        self._filter_pending.discard(context)
+        if not publish_filter.active:
+            self._filters.pop(context, None)
+            return
+        # the entity has just written its current state
+        publish_filter.published(self._filtered_value(context), time.monotonic())
+        self._filters[context] = publish_filter
+
+    @callback
+    def async_remove_publish_filter(self, context: tuple[str, Any]) -> None:
+        self._filters.pop(context, None)
+        self._filter_pending.discard(context)
+
+    def _filtered_value(self, context: tuple[str, Any]) -> Any:
+        category, key = context
+        if self.data is None:
+            return None
+        if category == "temperature":
+            return self.data.temperature.get(key)
+        return self.data.get(category, key)
+
+    def _filter_allows(self, context: tuple[str, Any], changed: bool, now: float) -> bool:
+        """Check a filtered channel, remembering held back values for the next update."""
+        publish_filter = self._filters[context]
+        value = self._filtered_value(context)
+        if publish_filter.should_publish(value, now):
+            publish_filter.published(value, now)
+            self._filter_pending.discard(context)
+            self.device.metrics.filtered_published += 1
+            return True
+        if value != publish_filter.value:
+            self._filter_pending.add(context)
+            if changed:
+                self.device.metrics.filtered_suppressed += 1
+        else:
+            self._filter_pending.discard(context)
+        return False
+
+    def _reset_filters(self) -> None:
+        """All entities are written, the filters start from their current values."""
+        now = time.monotonic()
+        for context, publish_filter in self._filters.items():
+            publish_filter.published(self._filtered_value(context), now)
+        self._filter_pending.clear()
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Notify only the entities whose channel changed since the last update.
 
+        Entities register with their (category, index) as listener context. A
+        full notification is done on the first update, on availability changes
+        and whenever the data was set without a computed diff. Changes of
+        channels with a publish filter are held back while they stay within
+        the deadband or come faster than its minimum interval.
+        """
+        changed = self._changed_channels
+        self._changed_channels = None
+        if self.last_update_success != self._notified_success:
+            self._notified_success = self.last_update_success
+            self.device.metrics.record_notified(len(self._listeners))
+            self._reset_filters()
+            super().async_update_listeners()
+            return
+        if changed is None:
+            if self.last_update_success:
+                self.device.metrics.record_notified(len(self._listeners))
+                self._reset_filters()
+                super().async_update_listeners()
+            return
+        notified = 0
+        now = time.monotonic()
+        filters = self._filters
+        pending = self._filter_pending
+        for update_callback, context in list(self._listeners.values()):
+            if context is None:
+                pass
+            elif context in filters:
+                if context not in changed and context not in pending:
+                    continue
+                if not self._filter_allows(context, context in changed, now):
+                    continue
+            elif context not in changed:
+                continue
+            notified += 1
+            update_callback()
+        self.device.metrics.record_notified(notified)
@@ -1,10 +1,12 @@
 from __future__ import annotations
 from homeassistant.components.binary_sensor import BinarySensorDeviceClass, BinarySensorEntity
 from homeassistant.core import HomeAssistant
-from .const import DOMAIN
-from . import STMDeviceDataUpdateCoordinator
+from . import STMDeviceDataUpdateCoordinator, entry_coordinators
+from .state import channel_accessor
 import logging
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import Platform
+from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.core import callback
@@ -17,8 +19,12 @@ async def async_setup_entry(
 ) -> None:
     """Add AccuWeather entities from a config_entry."""
 
-    coordinator: STMDeviceDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    for coordinator in entry_coordinators(hass, entry):
+        coordinator.async_add_entity_factory(entry, Platform.BINARY_SENSOR, _entities, async_add_entities)
 
+
+def _entities(coordinator: STMDeviceDataUpdateCoordinator, entry: ConfigEntry) -> list[Entity]:
+    """Entities of the channels in the controller's system_info."""
     binary_sensors = []
     if "button" in coordinator.system_info:
         for i in range(1, coordinator.system_info.get("button") + 1):
@@ -30,21 +36,24 @@ async def async_setup_entry(
     if "v_binary_sensor" in coordinator.system_info:
         for i in range(1, coordinator.system_info.get("v_binary_sensor") + 1):
             binary_sensors.append(VirtualBinarySensor(coordinator, i))
-    async_add_entities(binary_sensors)
+    return binary_sensors
 
 
 class ButtonShortBinarySensor(CoordinatorEntity, BinarySensorEntity):
     """Representation of a short-pressed button."""
     _attr_has_entity_name = True
+    # superseded by the press events of the button
+    _attr_entity_registry_enabled_default = False
 
     def __init__(self, coordinator, idx) -> None:
         """Initialize the binary sensor."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("button", idx))
         self.idx = idx
         self._attr_unique_id = f"{coordinator.system_info['device_index']}_button_{idx}".lower()
         self._attr_device_info = coordinator.device_info
         self._attr_name = f"Кнопка {idx} (короткое нажатие)"
         self._coordinator = coordinator
+        self._get_sensor_data = channel_accessor("button", idx)
         self._attr_is_on = self._get_sensor_data(self._coordinator.data)
 
     @callback
@@ -53,26 +62,22 @@ class ButtonShortBinarySensor(CoordinatorEntity, BinarySensorEntity):
         self._attr_is_on = self._get_sensor_data(self._coordinator.data)
         self.async_write_ha_state()
 
-    def _get_sensor_data(self, data):
-        """Get sensor data."""
-        if not "button" in data:
-            return None
-        if len(data["button"]) < self.idx:
-            return None
-        return bool(data["button"][(self.idx) - 1])
 
 class ButtonLongBinarySensor(CoordinatorEntity, BinarySensorEntity):
     """Representation of a long-pressed button."""
     _attr_has_entity_name = True
+    # superseded by the press events of the button
+    _attr_entity_registry_enabled_default = False
 
     def __init__(self, coordinator, idx) -> None:
         """Initialize the binary sensor."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("button_long", idx))
         self.idx = idx
         self._attr_unique_id = f"{coordinator.system_info['device_index']}_button_long_{idx}".lower()
         self._attr_device_info = coordinator.device_info
         self._attr_name = f"Кнопка {idx} (длинное нажатие)"
         self._coordinator = coordinator
+        self._get_sensor_data = channel_accessor("button_long", idx)
         self._attr_is_on = self._get_sensor_data(self._coordinator.data)
 
     @callback
@@ -81,14 +86,6 @@ class ButtonLongBinarySensor(CoordinatorEntity, BinarySensorEntity):
         self._attr_is_on = self._get_sensor_data(self._coordinator.data)
         self.async_write_ha_state()
 
-    def _get_sensor_data(self, data):
-        """Get sensor data."""
-        if not "button_long" in data:
-            return None
-        if len(data["button_long"]) < self.idx:
-            return None
-        return bool(data["button_long"][(self.idx) - 1])
-
 
 
 
@@ -98,12 +95,13 @@ class SimpleBinarySensor(CoordinatorEntity, BinarySensorEntity):
 
     def __init__(self, coordinator, idx) -> None:
         """Initialize the binary sensor."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("binary_sensor", idx))
         self.idx = idx
         self._attr_unique_id = f"{coordinator.system_info['device_index']}_binary_sensor_{idx}".lower()
         self._attr_device_info = coordinator.device_info
         self._attr_name = f"Бинарный сенсор {idx}"
         self._coordinator = coordinator
+        self._get_sensor_data = channel_accessor("binary_sensor", idx)
         self._attr_is_on = self._get_sensor_data(coordinator.data)
 
     @callback
@@ -112,14 +110,6 @@ class SimpleBinarySensor(CoordinatorEntity, BinarySensorEntity):
         self._attr_is_on = self._get_sensor_data(self._coordinator.data)
         self.async_write_ha_state()
 
-    def _get_sensor_data(self, data):
-        """Get sensor data."""
-        if "binary_sensor" not in data:
-            return None
-        if len(data["binary_sensor"]) < self.idx:
-            return None
-        return bool(data["binary_sensor"][(self.idx) - 1])
-
 
 class VirtualBinarySensor(CoordinatorEntity, BinarySensorEntity):
     """Representation of a binary sensor."""
@@ -127,12 +117,13 @@ class VirtualBinarySensor(CoordinatorEntity, BinarySensorEntity):
 
     def __init__(self, coordinator, idx) -> None:
         """Initialize the binary sensor."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("v_binary_sensor", idx))
         self.idx = idx
         self._attr_unique_id = f"{coordinator.system_info['device_index']}_virtual_binary_sensor_{idx}".lower()
         self._attr_device_info = coordinator.device_info
         self._attr_name = f"Виртуальный бинарный сенсор {idx}"
         self._coordinator = coordinator
+        self._get_sensor_data = channel_accessor("v_binary_sensor", idx)
         self._attr_is_on = self._get_sensor_data(coordinator.data)
 
     @callback
@@ -140,11 +131,3 @@ class VirtualBinarySensor(CoordinatorEntity, BinarySensorEntity):
         """Handle data update."""
         self._attr_is_on = self._get_sensor_data(self._coordinator.data)
         self.async_write_ha_state()
-
-    def _get_sensor_data(self, data):
-        """Get sensor data."""
-        if "v_binary_sensor" not in data:
-            return None
-        if len(data["v_binary_sensor"]) < self.idx:
-            return None
-        return bool(data["v_binary_sensor"][(self.idx) - 1])
\ No newline at end of file
@@ -1,10 +1,11 @@
 from __future__ import annotations
 from homeassistant.components.button import ButtonDeviceClass, ButtonEntity
 from homeassistant.core import HomeAssistant
-from .const import DOMAIN
-from . import STMDeviceDataUpdateCoordinator
+from . import STMDeviceDataUpdateCoordinator, entry_coordinators
 import logging
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import Platform
+from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
@@ -16,8 +17,12 @@ async def async_setup_entry(
 ) -> None:
     """Add AccuWeather entities from a config_entry."""
 
-    coordinator: STMDeviceDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    for coordinator in entry_coordinators(hass, entry):
+        coordinator.async_add_entity_factory(entry, Platform.BUTTON, _entities, async_add_entities)
 
+
+def _entities(coordinator: STMDeviceDataUpdateCoordinator, entry: ConfigEntry) -> list[Entity]:
+    """Entities of the channels in the controller's system_info."""
     buttons = []
     if "relay" in coordinator.system_info:
         for i in range(1, coordinator.system_info.get("relay") + 1):
@@ -25,7 +30,7 @@ async def async_setup_entry(
     if "v_button" in coordinator.system_info:
         for i in range(1, coordinator.system_info.get("v_button") + 1):
             buttons.append(VirtualButton(coordinator, i))
-    async_add_entities(buttons)
+    return buttons
 
 
 class RelayButton(CoordinatorEntity, ButtonEntity):
@@ -34,7 +39,7 @@ class RelayButton(CoordinatorEntity, ButtonEntity):
 
     def __init__(self, coordinator, idx) -> None:
         """Initialize the button."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("relay_button", idx))
         self.idx = idx
         self._attr_unique_id = f"{coordinator.system_info['device_index']}_relay_{idx}".lower()
         self._attr_device_info = coordinator.device_info
@@ -53,7 +58,7 @@ class VirtualButton(CoordinatorEntity, ButtonEntity):
 
     def __init__(self, coordinator, idx) -> None:
         """Initialize the button."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("v_button", idx))
         self.idx = idx
         self._attr_unique_id = f"{coordinator.system_info['device_index']}_virtual_{idx}".lower()
         self._attr_device_info = coordinator.device_info
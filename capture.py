@@ -0,0 +1,187 @@
+"""Capture of controller traffic and its replay."""
+from __future__ import annotations
+
+import asyncio
+import base64
+from collections import deque
+import json
+import logging
+import os
+import time
+from typing import Any, Iterable
+
+from .stm_device import STMDevice, APIError, ConnectionError
+
+_LOGGER = logging.getLogger(__name__)
+
+CAPTURE_MAX_BYTES = 1024 * 1024
+CAPTURE_BACKUPS = 3
+CAPTURE_RING_SIZE = 200
+
+
+class TrafficRecorder:
+    """Keep request/response pairs in memory and optionally in a rotating file.
+
+    Records are JSON lines: wall clock time, endpoint, method, params, HTTP
+    status, latency and the raw body (``body`` if it is UTF-8, ``body64``
+    otherwise) or the error. Lines are appended in an executor job, a file
+    is rotated to ``.1``..``.N`` once it exceeds max_bytes.
+    """
+
+    def __init__(self, path: str | None = None, max_bytes: int = CAPTURE_MAX_BYTES,
+                 backups: int = CAPTURE_BACKUPS, ring_size: int = CAPTURE_RING_SIZE) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.records: deque[dict[str, Any]] = deque(maxlen=ring_size)
+        self.dropped = 0
+        self._pending: list[str] = []
+        self._writer: asyncio.Future | None = None
+
+    def record(self, endpoint: str, method: str, params: Any, status: int | None, latency: float,
+               body: bytes | None = None, error: str | None = None) -> None:
+        record: dict[str, Any] = {
+            "ts": round(time.time(), 3),
+            "endpoint": endpoint,
+            "method": method,
+            "params": params if isinstance(params, dict) else None,
+            "status": status,
+            "latency": round(latency, 4),
+        }
+        if body is not None:
+            try:
+                record["body"] = body.decode()
+            except UnicodeDecodeError:
+                record["body64"] = base64.b64encode(body).decode()
+        if error is not None:
+            record["error"] = error
+        self.records.append(record)
+        if self.path is not None:
+            self._pending.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+            if len(self._pending) > 10 * self.records.maxlen:
+                # the disk does not keep up, keep the newest lines
+                self.dropped += len(self._pending) - self.records.maxlen
+                del self._pending[:-self.records.maxlen]
+            self._schedule_write()
+
+    def _schedule_write(self) -> None:
+        if self._writer is not None and not self._writer.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        lines, self._pending = self._pending, []
+        self._writer = loop.run_in_executor(None, self._write, lines)
+        self._writer.add_done_callback(self._written)
+
+    def _written(self, future: asyncio.Future) -> None:
+        if not future.cancelled() and (error := future.exception()) is not None:
+            _LOGGER.warning(f"Unable to write traffic capture {self.path}: {error}")
+        if self._pending:
+            self._schedule_write()
+
+    def _write(self, lines: list[str]) -> None:
+        data = ("\n".join(lines) + "\n").encode()
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size and size + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "ab") as file:
+            file.write(data)
+
+    def _rotate(self) -> None:
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    async def async_flush(self) -> None:
+        """Wait until every record is on disk."""
+        while self._writer is not None and not self._writer.done() or self._pending:
+            if self._writer is None or self._writer.done():
+                self._schedule_write()
+            await asyncio.shield(self._writer)
+
+    def recent(self, count: int | None = None) -> list[dict[str, Any]]:
+        records = list(self.records)
+        return records if count is None else records[-count:]
+
+
+def load_capture(path: str, backups: int = CAPTURE_BACKUPS) -> list[dict[str, Any]]:
+    """Read a capture file with its rotated parts, oldest first."""
+    records = []
+    paths = [f"{path}.{i}" for i in range(backups, 0, -1)] + [path]
+    for part in paths:
+        if not os.path.exists(part):
+            continue
+        with open(part, encoding="utf-8") as file:
+            records.extend(json.loads(line) for line in file if line.strip())
+    return records
+
+
+def _body(record: dict[str, Any]) -> bytes:
+    if "body64" in record:
+        return base64.b64decode(record["body64"])
+    return record.get("body", "").encode()
+
+
+class ReplayDevice(STMDevice):
+    """STMDevice answering GET requests from captured traffic.
+
+    Responses are returned in recorded order per endpoint, at their recorded
+    pace divided by speed (0 replays as fast as requested). Recorded errors
+    are raised again, POST requests succeed without effect. The last
+    system_info stays available once the capture is exhausted, other
+    endpoints then fail with ConnectionError and ``finished`` is set.
+    """
+
+    def __init__(self, records: Iterable[dict[str, Any]], speed: float = 1.0, ip_address: str = "127.0.0.1") -> None:
+        super().__init__(ip_address)
+        self.speed = speed
+        self.finished = asyncio.Event()
+        self._queues: dict[str, deque[dict[str, Any]]] = {}
+        self._last: dict[str, dict[str, Any]] = {}
+        records = [record for record in records if record.get("method") == "GET"]
+        self._first_ts = records[0]["ts"] if records else 0.0
+        self._started: float | None = None
+        for record in records:
+            self._queues.setdefault(record["endpoint"], deque()).append(record)
+
+    @property
+    def remaining(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def _send(self, endpoint: str, method: str, params: dict | None = None) -> bytes:
+        if method == "POST":
+            return b"{}"
+        queue = self._queues.get(endpoint)
+        if not queue:
+            if endpoint == "system_info" and endpoint in self._last:
+                return _body(self._last[endpoint])
+            self.finished.set()
+            raise ConnectionError(f"Replay of {endpoint} finished")
+        record = queue.popleft()
+        self._last[endpoint] = record
+        if self._started is None:
+            self._started = time.monotonic()
+        if self.speed:
+            delay = (record["ts"] - self._first_ts) / self.speed - (time.monotonic() - self._started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if not self.remaining:
+            self.finished.set()
+        self.metrics.record_request(endpoint, record.get("latency") or 0.0, len(record.get("body", "")))
+        if "error" in record:
+            if record.get("status"):
+                raise APIError(record["error"])
+            raise ConnectionError(record["error"])
+        return _body(record)
+
+    async def probe(self) -> bool:
+        return True
@@ -1,21 +1,70 @@
 """Config flow for STM32 Controller integration."""
 from __future__ import annotations
 
+import asyncio
+import ipaddress
 import logging
 from typing import Any
 
 import voluptuous as vol
 
 from homeassistant import config_entries, exceptions
-from homeassistant.core import HomeAssistant
-from homeassistant.const import CONF_IP_ADDRESS, CONF_NAME
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.data_entry_flow import AbortFlow
+from homeassistant.const import CONF_IP_ADDRESS, CONF_NAME, CONF_PORT
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
-from .const import DOMAIN
+from .const import (
+    DOMAIN,
+    CONF_COALESCE_WINDOW,
+    DEFAULT_COALESCE_WINDOW,
+    CONF_FAST_INTERVAL,
+    DEFAULT_FAST_INTERVAL,
+    CONF_IDLE_INTERVAL,
+    DEFAULT_IDLE_INTERVAL,
+    CONF_BURST_DURATION,
+    DEFAULT_BURST_DURATION,
+    CONF_PUSH_PORT,
+    DEFAULT_PUSH_PORT,
+    CONF_DEADBAND,
+    DEFAULT_DEADBAND,
+    CONF_DEADBAND_PERCENT,
+    DEFAULT_DEADBAND_PERCENT,
+    CONF_MIN_PUBLISH_INTERVAL,
+    DEFAULT_MIN_PUBLISH_INTERVAL,
+    CONF_MAX_PUBLISH_INTERVAL,
+    DEFAULT_MAX_PUBLISH_INTERVAL,
+    CONF_METERS,
+    CONF_METER_UNIT,
+    CONF_PULSES_PER_UNIT,
+    DEFAULT_PULSES_PER_UNIT,
+    CONF_CAPTURE,
+    DEFAULT_CAPTURE,
+    CONF_DELTA_STATE,
+    DEFAULT_DELTA_STATE,
+    CONF_MAX_IN_FLIGHT,
+    DEFAULT_MAX_IN_FLIGHT,
+    CONF_BINARY_STATE,
+    DEFAULT_BINARY_STATE,
+    CONF_ANALOG_SAMPLE_INTERVAL,
+    DEFAULT_ANALOG_SAMPLE_INTERVAL,
+    CONF_ANALOG_WINDOW,
+    DEFAULT_ANALOG_WINDOW,
+    CONF_HOSTS,
+    CONF_MIGRATE_ENTRIES,
+)
+from . import entry_coordinators
+from .discovery import NetworkTooLarge, async_discover, discovery_hosts
+from .meters import RATE_UNITS
 from .stm_device import STMDevice, InvalidIP, ConnectionError, APIError
 
 
 _LOGGER = logging.getLogger(__name__)
 
+CONF_NETWORK = "network"
+CONF_DEVICES = "devices"
+
 # This is the schema that used to display the UI to the user. This simple
 # schema has a single required host field, but it could include a number of fields
 # such as username, password etc. See other components in the HA core code for
@@ -31,6 +80,7 @@ DATA_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_IP_ADDRESS): str,
         vol.Required(CONF_NAME): str,
+        vol.Optional(CONF_PORT, default=80): vol.All(vol.Coerce(int), vol.Range(min=1, max=65535)),
      }
 )
 
@@ -42,8 +92,15 @@ async def validate_input(hass: HomeAssistant, data: dict) -> dict[str, Any]:
     """
     if len(data[CONF_NAME]) < 5:
         raise InvalidName
-    device = STMDevice(data[CONF_IP_ADDRESS])
-    return {"title": data[CONF_NAME]}
+    device = STMDevice(data[CONF_IP_ADDRESS], port=data.get(CONF_PORT, 80))
+    try:
+        async with asyncio.timeout(5):
+            system_info = await device.system_info
+    except TimeoutError as error:
+        raise ConnectionError(f"No answer from {data[CONF_IP_ADDRESS]}") from error
+    finally:
+        await device.close()
+    return {"title": data[CONF_NAME], "system_info": system_info}
 
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -56,8 +113,22 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     # changes.
     CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_POLL
 
+    def __init__(self) -> None:
+        """Initialize the flow."""
+        self._discovered: dict[str, dict[str, Any]] = {}
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry) -> OptionsFlowHandler:
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler(config_entry)
+
     async def async_step_user(self, user_input=None):
-        """Handle the initial step."""
+        """Let the user add a controller by address or search for controllers."""
+        return self.async_show_menu(step_id="user", menu_options=["manual", "discover", "hub"])
+
+    async def async_step_manual(self, user_input=None):
+        """Handle a controller entered by address."""
         # This goes through the steps to take the user through the setup process.
         # Using this it is possible to update the UI and prompt for additional
         # information. This example provides a single form (built from `DATA_SCHEMA`),
@@ -66,7 +137,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         # `validate_input` above.
         errors = {}
         if user_input is not None:
-            self._async_abort_entries_match({CONF_IP_ADDRESS: user_input[CONF_IP_ADDRESS]})
+            self._abort_if_configured(user_input[CONF_IP_ADDRESS])
             try:
                 info = await validate_input(self.hass, user_input)
             except (ConnectionError, APIError):
@@ -91,8 +162,262 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         # If there is no user input or there were errors, show the form again, including any errors that were found with the input.
         return self.async_show_form(
-            step_id="user", data_schema=DATA_SCHEMA, errors=errors
+            step_id="manual", data_schema=DATA_SCHEMA, errors=errors
         )
 
+    async def async_step_discover(self, user_input=None):
+        """Scan an address range for controllers."""
+        errors = {}
+        if user_input is not None:
+            try:
+                hosts = discovery_hosts(user_input[CONF_NETWORK], self._configured_ips())
+            except NetworkTooLarge:
+                errors[CONF_NETWORK] = "network_too_large"
+            except ValueError:
+                errors[CONF_NETWORK] = "invalid_network"
+            else:
+                found = await async_discover(async_get_clientsession(self.hass), hosts, user_input[CONF_PORT])
+                self._discovered = {result["ip_address"]: result for result in found}
+                if self._discovered:
+                    return await self.async_step_select()
+                errors["base"] = "no_devices_found"
+
+        schema = vol.Schema(
+            {
+                vol.Required(CONF_NETWORK, default=(user_input or {}).get(CONF_NETWORK, "192.168.1.0/24")): str,
+                vol.Optional(CONF_PORT, default=80): vol.All(vol.Coerce(int), vol.Range(min=1, max=65535)),
+            }
+        )
+        return self.async_show_form(step_id="discover", data_schema=schema, errors=errors)
+
+    async def async_step_select(self, user_input=None):
+        """Add the discovered controllers the user picked."""
+        if user_input is not None:
+            selected = [self._discovered[ip] for ip in user_input[CONF_DEVICES] if ip in self._discovered]
+            if not selected:
+                return self.async_abort(reason="no_devices_selected")
+            # every controller is its own entry, the others are created by import flows
+            for result in selected[1:]:
+                self.hass.async_create_task(self.hass.config_entries.flow.async_init(
+                    DOMAIN, context={"source": config_entries.SOURCE_IMPORT}, data=_entry_data(result)))
+            data = _entry_data(selected[0])
+            self._abort_if_configured(data[CONF_IP_ADDRESS])
+            return self.async_create_entry(title=data[CONF_NAME], data=data)
+
+        devices = {
+            ip: f"{result['system_info']['device_index']} v{result['system_info'].get('version', '?')} ({ip})"
+            for ip, result in self._discovered.items()
+        }
+        schema = vol.Schema({vol.Required(CONF_DEVICES, default=list(devices)): cv.multi_select(devices)})
+        return self.async_show_form(step_id="select", data_schema=schema,
+                                    description_placeholders={"count": f"{len(devices)}"})
+
+    async def async_step_hub(self, user_input=None):
+        """Create a hub entry polling many controllers, optionally taking over single controller entries."""
+        singles = {
+            entry.entry_id: f"{entry.title} ({entry.data[CONF_IP_ADDRESS]})"
+            for entry in self._async_current_entries() if CONF_HOSTS not in entry.data
+        }
+        errors = {}
+        if user_input is not None:
+            migrate = [entry_id for entry_id in user_input.get(CONF_MIGRATE_ENTRIES, []) if entry_id in singles]
+            try:
+                hosts = parse_hosts(user_input.get(CONF_HOSTS, ""))
+            except ValueError:
+                errors[CONF_HOSTS] = "invalid_hosts"
+            else:
+                for entry_id in migrate:
+                    entry = self.hass.config_entries.async_get_entry(entry_id)
+                    hosts.append({CONF_IP_ADDRESS: entry.data[CONF_IP_ADDRESS],
+                                  CONF_PORT: entry.data.get(CONF_PORT, 80)})
+                taken = self._configured_ips(exclude=migrate)
+                addresses = [host[CONF_IP_ADDRESS] for host in hosts]
+                # the controllers of a hub share its options, the moved entries bring theirs
+                options = [dict(self.hass.config_entries.async_get_entry(entry_id).options) for entry_id in migrate]
+                if len(user_input[CONF_NAME]) < 5:
+                    errors[CONF_NAME] = "invalid_name"
+                elif not hosts:
+                    errors["base"] = "no_hosts"
+                elif len(set(addresses)) != len(addresses) or taken.intersection(addresses):
+                    errors[CONF_HOSTS] = "already_configured"
+                elif any(entry_options != options[0] for entry_options in options):
+                    errors[CONF_MIGRATE_ENTRIES] = "options_differ"
+                else:
+                    return self.async_create_entry(title=user_input[CONF_NAME], data={
+                        CONF_NAME: user_input[CONF_NAME],
+                        CONF_HOSTS: hosts,
+                        CONF_MIGRATE_ENTRIES: migrate,
+                    }, options=options[0] if options else {})
+
+        user_input = user_input or {}
+        schema = vol.Schema(
+            {
+                vol.Required(CONF_NAME, default=user_input.get(CONF_NAME, "")): str,
+                vol.Optional(CONF_HOSTS, default=user_input.get(CONF_HOSTS, "")): str,
+                vol.Optional(CONF_MIGRATE_ENTRIES, default=user_input.get(CONF_MIGRATE_ENTRIES, [])):
+                    cv.multi_select(singles),
+            }
+        )
+        return self.async_show_form(step_id="hub", data_schema=schema, errors=errors)
+
+    @callback
+    def _configured_ips(self, exclude: list[str] = ()) -> set[str]:
+        """Addresses of the controllers of all entries but the excluded ones, hub entries included."""
+        configured = set()
+        for entry in self._async_current_entries():
+            if entry.entry_id in exclude:
+                continue
+            if CONF_HOSTS in entry.data:
+                configured.update(host[CONF_IP_ADDRESS] for host in entry.data[CONF_HOSTS])
+            else:
+                configured.add(entry.data.get(CONF_IP_ADDRESS))
+        return configured
+
+    def _abort_if_configured(self, ip_address: str) -> None:
+        """Abort if the controller has an entry of its own or belongs to a hub."""
+        if ip_address in self._configured_ips():
+            raise AbortFlow("already_configured")
+
+    async def async_step_import(self, import_data: dict[str, Any]):
+        """Create an entry for a controller found by discovery."""
+        self._abort_if_configured(import_data[CONF_IP_ADDRESS])
+        return self.async_create_entry(title=import_data[CONF_NAME], data=import_data)
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle options of a controller entry."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        """Initialize options flow."""
+        self._entry = config_entry
+        self._options: dict[str, Any] = {}
+        self._meters: dict[str, dict[str, Any]] = dict(config_entry.options.get(CONF_METERS, {}))
+        self._meter_idx = 0
+
+    async def async_step_init(self, user_input=None):
+        """Manage the options."""
+        if user_input is not None:
+            self._options = user_input
+            return await self.async_step_meter()
+
+        options = self._entry.options
+        schema = vol.Schema(
+            {
+                vol.Optional(
+                    CONF_COALESCE_WINDOW,
+                    default=options.get(CONF_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=1000)),
+                vol.Optional(
+                    CONF_MAX_IN_FLIGHT,
+                    default=options.get(CONF_MAX_IN_FLIGHT, DEFAULT_MAX_IN_FLIGHT),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1, max=8)),
+                vol.Optional(
+                    CONF_FAST_INTERVAL,
+                    default=options.get(CONF_FAST_INTERVAL, DEFAULT_FAST_INTERVAL),
+                ): vol.All(vol.Coerce(int), vol.Range(min=100, max=10000)),
+                vol.Optional(
+                    CONF_IDLE_INTERVAL,
+                    default=options.get(CONF_IDLE_INTERVAL, DEFAULT_IDLE_INTERVAL),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1, max=300)),
+                vol.Optional(
+                    CONF_BURST_DURATION,
+                    default=options.get(CONF_BURST_DURATION, DEFAULT_BURST_DURATION),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=600)),
+                vol.Optional(
+                    CONF_PUSH_PORT,
+                    default=options.get(CONF_PUSH_PORT, DEFAULT_PUSH_PORT),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=65535)),
+                vol.Optional(
+                    CONF_DEADBAND,
+                    default=options.get(CONF_DEADBAND, DEFAULT_DEADBAND),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Optional(
+                    CONF_DEADBAND_PERCENT,
+                    default=options.get(CONF_DEADBAND_PERCENT, DEFAULT_DEADBAND_PERCENT),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0, max=100)),
+                vol.Optional(
+                    CONF_MIN_PUBLISH_INTERVAL,
+                    default=options.get(CONF_MIN_PUBLISH_INTERVAL, DEFAULT_MIN_PUBLISH_INTERVAL),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=3600)),
+                vol.Optional(
+                    CONF_MAX_PUBLISH_INTERVAL,
+                    default=options.get(CONF_MAX_PUBLISH_INTERVAL, DEFAULT_MAX_PUBLISH_INTERVAL),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=86400)),
+                vol.Optional(
+                    CONF_ANALOG_SAMPLE_INTERVAL,
+                    default=options.get(CONF_ANALOG_SAMPLE_INTERVAL, DEFAULT_ANALOG_SAMPLE_INTERVAL),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=10000)),
+                vol.Optional(
+                    CONF_ANALOG_WINDOW,
+                    default=options.get(CONF_ANALOG_WINDOW, DEFAULT_ANALOG_WINDOW),
+                ): vol.All(vol.Coerce(int), vol.Range(min=5, max=3600)),
+                vol.Optional(
+                    CONF_DELTA_STATE,
+                    default=options.get(CONF_DELTA_STATE, DEFAULT_DELTA_STATE),
+                ): bool,
+                vol.Optional(
+                    CONF_BINARY_STATE,
+                    default=options.get(CONF_BINARY_STATE, DEFAULT_BINARY_STATE),
+                ): bool,
+                vol.Optional(
+                    CONF_CAPTURE,
+                    default=options.get(CONF_CAPTURE, DEFAULT_CAPTURE),
+                ): bool,
+            }
+        )
+        return self.async_show_form(step_id="init", data_schema=schema)
+
+    async def async_step_meter(self, user_input=None):
+        """Set the unit and pulses per unit of every counter."""
+        if user_input is not None:
+            self._meters[f"{self._meter_idx}"] = user_input
+        if self._entry.entry_id in self.hass.data.get(DOMAIN, {}):
+            # the counters of a hub share one meter setup per counter number
+            counters = max((coordinator.system_info or {}).get("counter", 0)
+                           for coordinator in entry_coordinators(self.hass, self._entry))
+        else:
+            counters = 0
+        if self._meter_idx >= counters:
+            return self.async_create_entry(title="", data={**self._options, CONF_METERS: self._meters})
+        self._meter_idx += 1
+        meter = self._meters.get(f"{self._meter_idx}", {})
+        schema = vol.Schema(
+            {
+                vol.Optional(
+                    CONF_METER_UNIT,
+                    default=meter.get(CONF_METER_UNIT, ""),
+                ): vol.In(["", *RATE_UNITS]),
+                vol.Optional(
+                    CONF_PULSES_PER_UNIT,
+                    default=meter.get(CONF_PULSES_PER_UNIT, DEFAULT_PULSES_PER_UNIT),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0.001)),
+            }
+        )
+        return self.async_show_form(step_id="meter", data_schema=schema,
+                                    description_placeholders={"counter": f"{self._meter_idx}"})
+
+
+def _entry_data(result: dict[str, Any]) -> dict[str, Any]:
+    """Entry data of a discovered controller, named after its device index."""
+    return {
+        CONF_IP_ADDRESS: result["ip_address"],
+        CONF_NAME: f"Controller {result['system_info']['device_index']}",
+        CONF_PORT: result["port"],
+    }
+
+
+def parse_hosts(text: str) -> list[dict[str, Any]]:
+    """Controllers of a hub from "ip[:port]" separated by commas or lines, ValueError if one is invalid."""
+    hosts = []
+    for item in text.replace(",", "\n").split():
+        address, _, port = item.partition(":")
+        ipaddress.IPv4Address(address)
+        port = int(port) if port else 80
+        if not 1 <= port <= 65535:
+            raise ValueError(f"Invalid port in {item}")
+        hosts.append({CONF_IP_ADDRESS: address, CONF_PORT: port})
+    return hosts
+
+
 class InvalidName(Exception):
     """Error to indicate there is an invalid Name."""
@@ -5,3 +5,52 @@
 DOMAIN = "stm32f103_homeassistant"
 MANUFACTURER = "Alexander Nezvanov"
 
+
+CONF_COALESCE_WINDOW = "coalesce_window"
+DEFAULT_COALESCE_WINDOW = 20  # ms
+CONF_MAX_IN_FLIGHT = "max_in_flight"
+DEFAULT_MAX_IN_FLIGHT = 2  # concurrent requests, the controller's TCP stack handles only a few sockets
+CONF_FAST_INTERVAL = "fast_interval"
+DEFAULT_FAST_INTERVAL = 250  # ms
+CONF_IDLE_INTERVAL = "idle_interval"
+DEFAULT_IDLE_INTERVAL = 15  # s
+CONF_BURST_DURATION = "burst_duration"
+DEFAULT_BURST_DURATION = 10  # s
+CONF_PUSH_PORT = "push_port"
+DEFAULT_PUSH_PORT = 0  # disabled
+# publish filter of temperature and analog input sensors, also settable per entity
+CONF_DEADBAND = "deadband"
+DEFAULT_DEADBAND = 0.0  # sensor units
+CONF_DEADBAND_PERCENT = "deadband_percent"
+DEFAULT_DEADBAND_PERCENT = 0.0  # % of the last published value
+CONF_MIN_PUBLISH_INTERVAL = "min_publish_interval"
+DEFAULT_MIN_PUBLISH_INTERVAL = 0  # s
+CONF_MAX_PUBLISH_INTERVAL = "max_publish_interval"
+DEFAULT_MAX_PUBLISH_INTERVAL = 600  # s, 0 to disable the heartbeat
+# per counter options as {"1": {CONF_METER_UNIT: "kWh", CONF_PULSES_PER_UNIT: 1000}}
+CONF_METERS = "meters"
+CONF_METER_UNIT = "unit"
+CONF_PULSES_PER_UNIT = "pulses_per_unit"
+DEFAULT_PULSES_PER_UNIT = 1
+# high-rate sampling of analog inputs, published as aggregates per window
+CONF_ANALOG_SAMPLE_INTERVAL = "analog_sample_interval"
+DEFAULT_ANALOG_SAMPLE_INTERVAL = 0  # ms, 0 samples on the polls only and publishes every value
+CONF_ANALOG_WINDOW = "analog_window"
+DEFAULT_ANALOG_WINDOW = 60  # s
+
+CONF_CAPTURE = "capture"
+DEFAULT_CAPTURE = False  # record controller traffic for replay
+CONF_DELTA_STATE = "delta_state"
+DEFAULT_DELTA_STATE = True  # poll /state?since= on firmware that supports it
+CONF_BINARY_STATE = "binary_state"
+DEFAULT_BINARY_STATE = True  # ask for the packed binary /state, JSON firmware ignores it
+
+# hub entries: controllers as [{"ip_address": ..., "port": ...}] and single entries still to be moved in
+CONF_HOSTS = "hosts"
+CONF_MIGRATE_ENTRIES = "migrate_entries"
+
+DATA_PUSH_LISTENERS = "push_listeners"
+DATA_SCHEDULER = "scheduler"
+
+# seconds an unconfirmed command value is kept on top of polled data
+OPTIMISTIC_TIMEOUT = 5
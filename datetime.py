@@ -1,12 +1,13 @@
 from __future__ import annotations
 from homeassistant.components.datetime import DateTimeEntity
 from homeassistant.core import HomeAssistant
-from .const import DOMAIN
-from . import STMDeviceDataUpdateCoordinator
+from . import STMDeviceDataUpdateCoordinator, entry_coordinators
 import logging
 import datetime
 
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import Platform
+from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
@@ -20,13 +21,15 @@ async def async_setup_entry(
 ) -> None:
     """Add AccuWeather entities from a config_entry."""
 
-    coordinator: STMDeviceDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    for coordinator in entry_coordinators(hass, entry):
+        coordinator.async_add_entity_factory(entry, Platform.DATETIME, _entities, async_add_entities)
 
-    datetimes = []
 
+def _entities(coordinator: STMDeviceDataUpdateCoordinator, entry: ConfigEntry) -> list[Entity]:
+    """Entities of the channels in the controller's system_info."""
+    datetimes = []
     datetimes.append(WorksSinceDateTime(coordinator))
-
-    async_add_entities(datetimes)
+    return datetimes
 
 
 class WorksSinceDateTime(CoordinatorEntity, DateTimeEntity):
@@ -35,7 +38,7 @@ class WorksSinceDateTime(CoordinatorEntity, DateTimeEntity):
 
     def __init__(self, coordinator) -> None:
         """Initialize the datetime."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("works_since", None))
         self._attr_unique_id = f"{coordinator.system_info['device_index']}_works_since".lower()
         self._attr_device_info = coordinator.device_info
         self._attr_name = f"Старт работы"
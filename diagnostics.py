@@ -0,0 +1,62 @@
+"""Diagnostics support for STM32 Controller integration."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from . import STMDeviceDataUpdateCoordinator
+from .const import DOMAIN, DATA_SCHEDULER, DATA_PUSH_LISTENERS
+from .hub import HubCoordinator
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    scheduler = hass.data[DOMAIN].get(DATA_SCHEDULER)
+    push_listeners = hass.data[DOMAIN].get(DATA_PUSH_LISTENERS, {})
+
+    diagnostics = {
+        "entry": {
+            "data": dict(entry.data),
+            "options": dict(entry.options),
+        },
+        "scheduler": scheduler.stats if scheduler is not None else None,
+        "push": {
+            port: {"received": listener.received, "dropped": listener.dropped}
+            for port, listener in push_listeners.items()
+        },
+    }
+    if isinstance(coordinator, HubCoordinator):
+        diagnostics["hub"] = coordinator.stats
+        diagnostics["controllers"] = {
+            ip_address: _controller_diagnostics(child) for ip_address, child in coordinator.coordinators.items()
+        }
+    else:
+        diagnostics.update(_controller_diagnostics(coordinator))
+    return diagnostics
+
+
+def _controller_diagnostics(coordinator: STMDeviceDataUpdateCoordinator) -> dict[str, Any]:
+    device = coordinator.device
+    breaker = device.breaker
+    return {
+        "system_info": coordinator.system_info,
+        "state": coordinator.data.as_dict() if coordinator.data is not None else None,
+        "works_since": coordinator.works_since.isoformat() if coordinator.works_since else None,
+        "poll_interval": coordinator.poll_interval,
+        "breaker": {
+            "state": breaker.state,
+            "failures": breaker.failures,
+            "opened": breaker.opened,
+        },
+        "connections": device.connection_stats,
+        "metrics": device.metrics.as_dict(),
+        "sampler": coordinator.sampler.stats if coordinator.sampler is not None else None,
+        "capture": {
+            "path": device.recorder.path,
+            "dropped": device.recorder.dropped,
+            "recent": device.recorder.recent(),
+        } if device.recorder is not None else None,
+    }
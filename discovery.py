@@ -0,0 +1,64 @@
+"""Discovery of controllers in an IP range."""
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import logging
+from typing import Any, Iterable
+
+import aiohttp
+
+_LOGGER = logging.getLogger(__name__)
+
+# parallel probes of a scan
+DISCOVERY_CONCURRENCY = 64
+# seconds a single address may take to answer /system_info
+DISCOVERY_TIMEOUT = 1.5
+# largest range scanned at once, a /22
+DISCOVERY_MAX_HOSTS = 1024
+
+
+class NetworkTooLarge(Exception):
+    """Error to indicate the range has more than DISCOVERY_MAX_HOSTS addresses."""
+
+
+def discovery_hosts(network: str, skip: Iterable[str] = ()) -> list[str]:
+    """Host addresses of a CIDR range without the skipped ones, ValueError if it is not a range."""
+    parsed = ipaddress.ip_network(network.strip(), strict=False)
+    if parsed.version != 4:
+        raise ValueError(f"{network} is not an IPv4 range")
+    if parsed.num_addresses > DISCOVERY_MAX_HOSTS:
+        raise NetworkTooLarge(network)
+    skip = set(skip)
+    hosts = [str(host) for host in parsed.hosts()] or [str(parsed.network_address)]
+    return [host for host in hosts if host not in skip]
+
+
+async def async_discover(session: aiohttp.ClientSession, hosts: Iterable[str], port: int = 80,
+                         concurrency: int = DISCOVERY_CONCURRENCY,
+                         timeout: float = DISCOVERY_TIMEOUT) -> list[dict[str, Any]]:
+    """Probe hosts for /system_info, return the controllers that answered sorted by address.
+
+    Every result has the ip_address, port and the system_info of the controller.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def probe(host: str) -> dict[str, Any] | None:
+        url = f"http://{host}/system_info" if port == 80 else f"http://{host}:{port}/system_info"
+        async with semaphore:
+            try:
+                async with session.get(url, timeout=client_timeout) as response:
+                    if response.status != 200:
+                        return None
+                    system_info = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                return None
+        if not isinstance(system_info, dict) or "device_index" not in system_info:
+            return None
+        return {"ip_address": host, "port": port, "system_info": system_info}
+
+    results = await asyncio.gather(*(probe(host) for host in hosts))
+    found = [result for result in results if result is not None]
+    _LOGGER.debug(f"Discovery found {len(found)} controller(s)")
+    return sorted(found, key=lambda result: ipaddress.ip_address(result["ip_address"]))
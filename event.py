@@ -0,0 +1,57 @@
+from __future__ import annotations
+from homeassistant.components.event import EventDeviceClass, EventEntity
+from homeassistant.core import HomeAssistant
+from . import STMDeviceDataUpdateCoordinator, entry_coordinators
+from .presses import PRESS_EVENT_TYPES
+import logging
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import Platform
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.core import callback
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_setup_entry(
+        hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
+) -> None:
+    """Add button press event entities from a config_entry."""
+
+    for coordinator in entry_coordinators(hass, entry):
+        coordinator.async_add_entity_factory(entry, Platform.EVENT, _entities, async_add_entities)
+
+
+def _entities(coordinator: STMDeviceDataUpdateCoordinator, entry: ConfigEntry) -> list[Entity]:
+    """Entities of the channels in the controller's system_info."""
+    events = []
+    if "button" in coordinator.system_info:
+        for i in range(1, coordinator.system_info.get("button") + 1):
+            events.append(ButtonPressEvent(coordinator, i))
+    return events
+
+
+class ButtonPressEvent(CoordinatorEntity, EventEntity):
+    """Presses of a wall button."""
+    _attr_has_entity_name = True
+    _attr_device_class = EventDeviceClass.BUTTON
+    _attr_event_types = PRESS_EVENT_TYPES
+
+    def __init__(self, coordinator, idx) -> None:
+        """Initialize the event entity."""
+        super().__init__(coordinator, context=("button_event", idx))
+        self.idx = idx
+        self._attr_unique_id = f"{coordinator.system_info['device_index']}_button_event_{idx}".lower()
+        self._attr_device_info = coordinator.device_info
+        self._attr_name = f"Кнопка {idx}"
+        self._coordinator = coordinator
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self.async_on_remove(self._coordinator.async_subscribe_presses(self.idx, self._async_handle_press))
+
+    @callback
+    def _async_handle_press(self, event_type: str, attributes: dict) -> None:
+        self._trigger_event(event_type, attributes)
+        self.async_write_ha_state()
@@ -0,0 +1,75 @@
+"""Deadband and rate limiting of noisy sensor channels."""
+from __future__ import annotations
+
+from typing import Any, Mapping
+
+from .const import (
+    CONF_DEADBAND,
+    DEFAULT_DEADBAND,
+    CONF_DEADBAND_PERCENT,
+    DEFAULT_DEADBAND_PERCENT,
+    CONF_MIN_PUBLISH_INTERVAL,
+    DEFAULT_MIN_PUBLISH_INTERVAL,
+    CONF_MAX_PUBLISH_INTERVAL,
+    DEFAULT_MAX_PUBLISH_INTERVAL,
+)
+
+FILTER_OPTIONS = (CONF_DEADBAND, CONF_DEADBAND_PERCENT, CONF_MIN_PUBLISH_INTERVAL, CONF_MAX_PUBLISH_INTERVAL)
+
+
+class PublishFilter:
+    """Decide whether a new channel value is worth a state write.
+
+    A value is published when it moved more than the deadband (the larger of
+    the absolute and the percent threshold) away from the last published
+    value and at least min_interval passed since then. Any change is
+    published once max_interval passed, so slow drifts are not lost.
+    """
+
+    __slots__ = ("deadband", "percent", "min_interval", "max_interval", "value", "published_at")
+
+    def __init__(self, deadband: float = DEFAULT_DEADBAND, percent: float = DEFAULT_DEADBAND_PERCENT,
+                 min_interval: float = DEFAULT_MIN_PUBLISH_INTERVAL,
+                 max_interval: float = DEFAULT_MAX_PUBLISH_INTERVAL) -> None:
+        self.deadband = deadband
+        self.percent = percent
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.value: float | None = None
+        self.published_at: float | None = None
+
+    @classmethod
+    def from_options(cls, *options: Mapping[str, Any] | None) -> PublishFilter:
+        """Build a filter from option mappings, later ones override earlier ones."""
+        merged: dict[str, Any] = {}
+        for mapping in options:
+            if mapping:
+                merged.update({key: mapping[key] for key in FILTER_OPTIONS if mapping.get(key) is not None})
+        return cls(
+            float(merged.get(CONF_DEADBAND, DEFAULT_DEADBAND)),
+            float(merged.get(CONF_DEADBAND_PERCENT, DEFAULT_DEADBAND_PERCENT)),
+            float(merged.get(CONF_MIN_PUBLISH_INTERVAL, DEFAULT_MIN_PUBLISH_INTERVAL)),
+            float(merged.get(CONF_MAX_PUBLISH_INTERVAL, DEFAULT_MAX_PUBLISH_INTERVAL)),
+        )
+
+    @property
+    def active(self) -> bool:
+        """False when the options let every change through."""
+        return bool(self.deadband or self.percent or self.min_interval)
+
+    def should_publish(self, value: Any, now: float) -> bool:
+        if value is None or self.value is None or self.published_at is None:
+            return True
+        if value == self.value:
+            return False
+        elapsed = now - self.published_at
+        if elapsed < self.min_interval:
+            return False
+        if self.max_interval and elapsed >= self.max_interval:
+            return True
+        threshold = max(self.deadband, abs(self.value) * self.percent / 100)
+        return abs(value - self.value) > threshold
+
+    def published(self, value: Any, now: float) -> None:
+        self.value = value
+        self.published_at = now
@@ -0,0 +1,159 @@
+"""Hub entries managing many controllers with one batched coordinator."""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers import device_registry as dr, entity_registry as er
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+
+from .const import DOMAIN
+from .state import StateSnapshot
+from .stm_device import APIError, ConnectionError, InvalidMethod
+from .store import ControllerStore
+
+if TYPE_CHECKING:
+    from . import STMDeviceDataUpdateCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+# controllers of a hub polled at the same time
+HUB_CONCURRENCY = 32
+# how often controllers unreachable at setup are tried again
+HUB_RETRY_INTERVAL = dt.timedelta(minutes=5)
+
+
+class HubCoordinator(DataUpdateCoordinator[dict[str, StateSnapshot]]):
+    """Poll the controllers of a hub entry in one batched cycle.
+
+    The hub is registered with the PollScheduler like a single coordinator.
+    Each cycle refreshes every controller whose own (adaptive) interval is
+    due, concurrently, and publishes the per-controller snapshots by IP
+    address. The controllers keep their own coordinators, entities listen to
+    those, so a cycle only notifies the entities of channels that changed.
+    """
+
+    def __init__(self, hass: HomeAssistant, name: str) -> None:
+        """Initialize."""
+        self.ip_address = f"hub {name}"
+        self.coordinators: dict[str, STMDeviceDataUpdateCoordinator] = {}
+        self.scheduler = None
+        self._next_due: dict[str, float] = {}
+        self._semaphore = asyncio.Semaphore(HUB_CONCURRENCY)
+        self.cycles = 0
+        self.last_cycle_duration = 0.0
+        super().__init__(hass, _LOGGER, name=f"{DOMAIN} hub {name}", update_interval=None)
+
+    @property
+    def poll_interval(self) -> float:
+        """The hub cycles as often as its fastest controller polls."""
+        return min((child.poll_interval for child in self.coordinators.values()), default=15.0)
+
+    @callback
+    def add(self, coordinator: STMDeviceDataUpdateCoordinator) -> None:
+        self.coordinators[coordinator.ip_address] = coordinator
+        self._next_due[coordinator.ip_address] = 0.0
+        # activity of a controller brings the next cycle forward
+        coordinator.scheduler = self
+
+    @callback
+    def poll_soon(self, coordinator: STMDeviceDataUpdateCoordinator) -> None:
+        ip_address = coordinator.ip_address
+        if ip_address in self._next_due:
+            self._next_due[ip_address] = min(self._next_due[ip_address], time.monotonic() + coordinator.poll_interval)
+        if self.scheduler is not None:
+            self.scheduler.poll_soon(self)
+
+    async def _async_update_data(self) -> dict[str, StateSnapshot]:
+        started = time.monotonic()
+        # half an interval of slack so controllers due just after the cycle do not wait a whole one
+        horizon = started + self.poll_interval / 2
+        due = [child for ip_address, child in self.coordinators.items() if self._next_due[ip_address] <= horizon]
+        for child in due:
+            self._next_due[child.ip_address] = started + child.poll_interval
+        await asyncio.gather(*(self._refresh(child) for child in due))
+        self.cycles += 1
+        self.last_cycle_duration = time.monotonic() - started
+        return {ip_address: child.data for ip_address, child in self.coordinators.items()}
+
+    async def _refresh(self, child: STMDeviceDataUpdateCoordinator) -> None:
+        async with self._semaphore:
+            # failures are handled and logged by the controller's coordinator
+            await child.async_refresh()
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            "controllers": len(self.coordinators),
+            "available": sum(1 for child in self.coordinators.values() if child.last_update_success),
+            "cycles": self.cycles,
+            "poll_interval": self.poll_interval,
+            "last_cycle_ms": round(self.last_cycle_duration * 1000, 3),
+        }
+
+
+@callback
+def async_retry_unreachable(hass: HomeAssistant, entry: ConfigEntry,
+                            coordinators: list[STMDeviceDataUpdateCoordinator]) -> CALLBACK_TYPE:
+    """Reload the hub entry once a controller that was unreachable at setup answers.
+
+    Returns a callback stopping the retries and closing the controllers.
+    """
+    async def retry(_now: dt.datetime) -> None:
+        for coordinator in coordinators:
+            try:
+                async with asyncio.timeout(5):
+                    await coordinator.device.system_info
+            except (APIError, ConnectionError, InvalidMethod, TimeoutError):
+                continue
+            _LOGGER.info(f"Controller {coordinator.ip_address} of {entry.title} is reachable, reloading")
+            hass.config_entries.async_schedule_reload(entry.entry_id)
+            return
+
+    cancel = async_track_time_interval(hass, retry, HUB_RETRY_INTERVAL)
+
+    @callback
+    def stop() -> None:
+        cancel()
+        for coordinator in coordinators:
+            hass.async_create_task(coordinator.device.close())
+
+    return stop
+
+
+def hub_store_key(entry_id: str, ip_address: str) -> str:
+    return f"{entry_id}_{ip_address}"
+
+
+async def async_migrate_into_hub(hass: HomeAssistant, hub: ConfigEntry, entry_ids: list[str]) -> None:
+    """Move single controller entries into a hub entry.
+
+    Devices and entities are re-linked to the hub entry, so entity IDs,
+    unique IDs, names and history stay as they are, and the persisted
+    controller data is copied before the old entries are removed.
+    """
+    device_registry = dr.async_get(hass)
+    entity_registry = er.async_get(hass)
+    for entry_id in entry_ids:
+        if (entry := hass.config_entries.async_get_entry(entry_id)) is None or entry.domain != DOMAIN:
+            continue
+        ip_address = entry.data["ip_address"]
+        old_store = ControllerStore(hass, entry_id)
+        await old_store.async_load()
+        if old_store.data:
+            new_store = ControllerStore(hass, hub_store_key(hub.entry_id, ip_address))
+            new_store.data = old_store.data
+            await new_store.async_save_now()
+        for entity in er.async_entries_for_config_entry(entity_registry, entry_id):
+            entity_registry.async_update_entity(entity.entity_id, config_entry_id=hub.entry_id)
+        for device in dr.async_entries_for_config_entry(device_registry, entry_id):
+            device_registry.async_update_device(device.id, add_config_entry_id=hub.entry_id)
+            device_registry.async_update_device(device.id, remove_config_entry_id=entry_id)
+        _LOGGER.info(f"Moved controller {ip_address} from entry {entry.title} into hub {hub.title}")
+        await hass.config_entries.async_remove(entry_id)
@@ -0,0 +1,98 @@
+"""Totals and rates of the pulse counters of a controller."""
+from __future__ import annotations
+
+from typing import Any, Mapping
+
+from .const import CONF_METER_UNIT, CONF_PULSES_PER_UNIT, DEFAULT_PULSES_PER_UNIT
+
+# counters are 32 bit on the controller
+COUNTER_WRAP = 1 << 32
+# shortest controller uptime span a rate is computed over, s
+RATE_WINDOW = 10
+# rate unit and seconds per rate unit time of every total unit
+RATE_UNITS = {
+    "kWh": ("kW", 3600),
+    "Wh": ("W", 3600),
+    "m³": ("m³/h", 3600),
+    "L": ("L/min", 60),
+}
+DEFAULT_RATE_UNIT = ("imp/h", 3600)
+
+
+class CounterTracker:
+    """Monotonic total and rate of one counter.
+
+    The controller counts pulses from zero after every reboot and wraps at
+    32 bits. Resets and wraps are folded into a persistent offset so the
+    total never goes backwards. The rate is computed from successive samples
+    with the controller uptime as time base, so poll jitter and HA restarts
+    do not distort it.
+    """
+
+    __slots__ = ("unit", "pulses_per_unit", "rate_unit", "_rate_scale", "offset", "last_raw", "last_up",
+                 "rate", "_window_pulses", "_window_up")
+
+    def __init__(self, unit: str | None = None, pulses_per_unit: float = DEFAULT_PULSES_PER_UNIT,
+                 offset: int = 0, last_raw: int | None = None) -> None:
+        self.unit = unit or None
+        self.pulses_per_unit = pulses_per_unit or DEFAULT_PULSES_PER_UNIT
+        self.rate_unit, self._rate_scale = RATE_UNITS.get(unit, DEFAULT_RATE_UNIT)
+        self.offset = offset
+        self.last_raw = last_raw
+        self.last_up: int | None = None
+        self.rate: float | None = None
+        self._window_pulses = 0
+        self._window_up: int | None = None
+
+    @classmethod
+    def from_options(cls, options: Mapping[str, Any] | None, stored: Mapping[str, Any] | None) -> CounterTracker:
+        options = options or {}
+        stored = stored or {}
+        return cls(options.get(CONF_METER_UNIT),
+                   float(options.get(CONF_PULSES_PER_UNIT, DEFAULT_PULSES_PER_UNIT)),
+                   stored.get("offset", 0), stored.get("last"))
+
+    @property
+    def pulses(self) -> int | None:
+        if self.last_raw is None:
+            return None
+        return self.offset + self.last_raw
+
+    @property
+    def total(self) -> float | None:
+        if (pulses := self.pulses) is None:
+            return None
+        return round(pulses / self.pulses_per_unit, 6)
+
+    def update(self, raw: int | None, up: int | None, rebooted: bool = False) -> None:
+        """Take a counter sample read at controller uptime up.
+
+        rebooted is the coordinator's reboot detection, which also sees
+        reboots while HA was down or the controller unreachable.
+        """
+        if raw is None:
+            return
+        raw = int(raw)
+        rebooted = rebooted or up is not None and self.last_up is not None and up < self.last_up
+        if self.last_raw is not None and (rebooted or raw < self.last_raw):
+            if not rebooted and self.last_raw >= COUNTER_WRAP * 3 // 4 and raw < COUNTER_WRAP // 4:
+                self.offset += COUNTER_WRAP
+            else:
+                # reset by a reboot, possibly while HA was down
+                self.offset += self.last_raw
+        self.last_raw = raw
+        self.last_up = up
+        pulses = self.offset + raw
+        if up is None:
+            self.rate = None
+        elif rebooted or self._window_up is None:
+            # pulses between the last sample and a reboot are lost, start over
+            self._window_pulses, self._window_up = pulses, up
+        elif up - self._window_up >= RATE_WINDOW:
+            units = (pulses - self._window_pulses) / self.pulses_per_unit
+            self.rate = round(units / (up - self._window_up) * self._rate_scale, 3)
+            self._window_pulses, self._window_up = pulses, up
+
+    def as_dict(self) -> dict[str, Any]:
+        """What has to survive an HA restart."""
+        return {"offset": self.offset, "last": self.last_raw}
@@ -0,0 +1,195 @@
+"""Request and poll metrics of a controller."""
+from __future__ import annotations
+
+from typing import Any
+
+# upper bounds of the latency buckets, seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf"))
+
+
+class LatencyHistogram:
+    """Fixed bucket histogram, cheap enough to update on every request."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th percentile (max for the last bucket)."""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(LATENCY_BUCKETS[i], self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / self.count if self.count else None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": _ms(self.mean),
+            "p50_ms": _ms(self.percentile(50)),
+            "p99_ms": _ms(self.percentile(99)),
+            "max_ms": _ms(self.max) if self.count else None,
+            "buckets": {
+                ("inf" if bound == float("inf") else f"{bound * 1000:g}ms"): count
+                for bound, count in zip(LATENCY_BUCKETS, self.counts)
+            },
+        }
+
+
+class EndpointMetrics:
+    """Counters of one API endpoint."""
+
+    __slots__ = ("requests", "errors", "timeouts", "rejected", "latency", "last_size")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.latency = LatencyHistogram()
+        self.last_size = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "last_size": self.last_size,
+            "latency": self.latency.as_dict(),
+        }
+
+
+class DeviceMetrics:
+    """Everything measured on the hot path of one controller."""
+
+    def __init__(self) -> None:
+        self.endpoints: dict[str, EndpointMetrics] = {}
+        self.all_requests = LatencyHistogram()
+        self.poll_duration = LatencyHistogram()
+        self.poll_jitter = LatencyHistogram()
+        self.polls = 0
+        self.last_poll_duration = 0.0
+        self.last_entities_notified = 0
+        self.entities_notified = 0
+        # changes of filtered sensor channels, published or held back by the deadband
+        self.filtered_published = 0
+        self.filtered_suppressed = 0
+        self.reboots = 0
+        self.restores = 0
+        # /state answers: full documents, deltas, "not modified" and deltas that did not fit the cache
+        self.state_full = 0
+        # full states in the packed binary format
+        self.state_binary = 0
+        # channel values in decoded states that were not numbers, the channels read as unknown
+        self.invalid_values = 0
+        # time requests waited for a connection slot per priority lane, and the waiting requests
+        self.queue_wait: dict[str, LatencyHistogram] = {}
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        # GET requests served by an identical request already in flight
+        self.single_flight_joined = 0
+        self.state_delta = 0
+        self.state_unchanged = 0
+        self.delta_fallbacks = 0
+
+    def endpoint(self, endpoint: str) -> EndpointMetrics:
+        if (metrics := self.endpoints.get(endpoint)) is None:
+            metrics = self.endpoints[endpoint] = EndpointMetrics()
+        return metrics
+
+    def record_request(self, endpoint: str, seconds: float, size: int = 0) -> None:
+        metrics = self.endpoint(endpoint)
+        metrics.requests += 1
+        metrics.latency.observe(seconds)
+        if size:
+            metrics.last_size = size
+        self.all_requests.observe(seconds)
+
+    def record_poll(self, seconds: float, jitter: float | None) -> None:
+        self.polls += 1
+        self.last_poll_duration = seconds
+        self.poll_duration.observe(seconds)
+        if jitter is not None:
+            self.poll_jitter.observe(abs(jitter))
+
+    def record_queue_wait(self, lane: str, seconds: float, depth: int) -> None:
+        if (histogram := self.queue_wait.get(lane)) is None:
+            histogram = self.queue_wait[lane] = LatencyHistogram()
+        histogram.observe(seconds)
+        self.queue_depth = depth
+
+    def record_queue_depth(self, depth: int) -> None:
+        self.queue_depth = depth
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def record_notified(self, count: int) -> None:
+        self.last_entities_notified = count
+        self.entities_notified += count
+
+    @property
+    def suppression_ratio(self) -> float | None:
+        """Share of filtered channel changes that did not cause a state write."""
+        total = self.filtered_published + self.filtered_suppressed
+        return self.filtered_suppressed / total if total else None
+
+    @property
+    def errors(self) -> int:
+        return sum(metrics.errors for metrics in self.endpoints.values())
+
+    @property
+    def timeouts(self) -> int:
+        return sum(metrics.timeouts for metrics in self.endpoints.values())
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "endpoints": {name: metrics.as_dict() for name, metrics in self.endpoints.items()},
+            "requests": self.all_requests.as_dict(),
+            "polls": self.polls,
+            "poll_duration": self.poll_duration.as_dict(),
+            "poll_jitter": self.poll_jitter.as_dict(),
+            "last_entities_notified": self.last_entities_notified,
+            "entities_notified": self.entities_notified,
+            "filtered_published": self.filtered_published,
+            "filtered_suppressed": self.filtered_suppressed,
+            "suppression_ratio": self.suppression_ratio,
+            "reboots": self.reboots,
+            "restores": self.restores,
+            "state_full": self.state_full,
+            "state_binary": self.state_binary,
+            "invalid_values": self.invalid_values,
+            "state_delta": self.state_delta,
+            "state_unchanged": self.state_unchanged,
+            "delta_fallbacks": self.delta_fallbacks,
+            "queue_wait": {lane: histogram.as_dict() for lane, histogram in self.queue_wait.items()},
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "single_flight_joined": self.single_flight_joined,
+        }
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 2)
@@ -1,11 +1,13 @@
 from __future__ import annotations
 from homeassistant.components.number import NumberDeviceClass, NumberEntity, RestoreNumber
 from homeassistant.core import HomeAssistant
-from .const import DOMAIN
-from . import STMDeviceDataUpdateCoordinator
+from . import STMDeviceDataUpdateCoordinator, entry_coordinators
+from .state import channel_accessor
 import logging
 
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import Platform
+from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
@@ -19,8 +21,12 @@ async def async_setup_entry(
 ) -> None:
     """Add AccuWeather entities from a config_entry."""
 
-    coordinator: STMDeviceDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    for coordinator in entry_coordinators(hass, entry):
+        coordinator.async_add_entity_factory(entry, Platform.NUMBER, _entities, async_add_entities)
 
+
+def _entities(coordinator: STMDeviceDataUpdateCoordinator, entry: ConfigEntry) -> list[Entity]:
+    """Entities of the channels in the controller's system_info."""
     numbers = []
     if "v_numeric" in coordinator.system_info:
         for i in range(1, coordinator.system_info.get("v_numeric") + 1):
@@ -31,8 +37,7 @@ async def async_setup_entry(
                 min_value = 0
                 max_value = 100
             numbers.append(VirtualNumber(coordinator, i, min_value, max_value))
-
-    async_add_entities(numbers)
+    return numbers
 
 
 class VirtualNumber(CoordinatorEntity, RestoreNumber, NumberEntity):
@@ -41,13 +46,14 @@ class VirtualNumber(CoordinatorEntity, RestoreNumber, NumberEntity):
 
     def __init__(self, coordinator, idx, min_value, max_value) -> None:
         """Initialize the switch."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("v_numeric", idx))
         self.idx = idx
         self._attr_unique_id = f"{coordinator.system_info['device_index']}_virtual_{idx}".lower()
         self._attr_device_info = coordinator.device_info
         self._attr_name = f"Виртуальное число {idx}"
         self._attr_native_step = 1
         self._coordinator = coordinator
+        self._get_numeric_data = channel_accessor("v_numeric", idx)
         self._attr_native_value = self._get_numeric_data(coordinator.data)
         self._attr_native_min_value = min_value
         self._attr_native_max_value = max_value
@@ -55,7 +61,7 @@ class VirtualNumber(CoordinatorEntity, RestoreNumber, NumberEntity):
 
     async def async_set_native_value(self, value: float) -> None:
         """Update the current value."""
-        await self._coordinator.device.api_request("v_numeric", "POST", {f"{self.idx}": int(value)})
+        await self._coordinator.async_write_channel("v_numeric", self.idx, int(value))
 
     @callback
     def _handle_coordinator_update(self) -> None:
@@ -63,21 +69,11 @@ class VirtualNumber(CoordinatorEntity, RestoreNumber, NumberEntity):
         self._attr_native_value = self._get_numeric_data(self._coordinator.data)
         self.async_write_ha_state()
 
-    def _get_numeric_data(self, data):
-        """Get number data."""
-        if not "v_numeric" in data:
-            return None
-        if len(data["v_numeric"]) < self.idx:
-            return None
-        return float(data["v_numeric"][(self.idx) - 1])
-
-
     async def async_added_to_hass(self) -> None:
         """Restore on startup."""
         await super().async_added_to_hass()
 
-        if not (await self.async_get_last_number_data()):
+        if not (last_number_data := await self.async_get_last_number_data()):
             return
-        self._attr_native_value = self.native_value
-        if self.native_value != 0:
-            await self.async_set_native_value(self.native_value)
\ No newline at end of file
+        if last_number_data.native_value is not None:
+            self._coordinator.async_seed_desired("v_numeric", self.idx, int(last_number_data.native_value))
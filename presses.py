@@ -0,0 +1,86 @@
+"""Button press detection from successive controller snapshots."""
+from __future__ import annotations
+
+import time
+
+from .state import StateSnapshot
+
+SHORT_PRESS = "short_press"
+LONG_PRESS = "long_press"
+MULTI_PRESS = "multi_press"
+PRESS_EVENT_TYPES = [SHORT_PRESS, LONG_PRESS, MULTI_PRESS]
+
+# press sequence counters of newer firmware are 16 bit
+PRESS_SEQ_WRAP = 1 << 16
+# short presses of one button closer than this are counted as a multi press, s
+MULTI_PRESS_WINDOW = 0.6
+
+# press category -> its optional sequence counter category
+SEQ_CATEGORIES = {"button": "button_seq", "button_long": "button_long_seq"}
+
+
+class PressDetector:
+    """Turn snapshot changes into press events without loss or double counting.
+
+    With press sequence counters (``button_seq``/``button_long_seq``) every
+    press since the previous snapshot is counted, also those that started and
+    ended between two polls. Without them presses are rising edges of the
+    button bits; pushed edges update the coordinator data in between, so a
+    press seen by push is not counted again by the next poll.
+    """
+
+    def __init__(self) -> None:
+        # button index -> (time of the last short press, presses in the current multi press)
+        self._last_short: dict[int, tuple[float, int]] = {}
+
+    def detect(self, previous: StateSnapshot | None, current: StateSnapshot,
+               resync: bool = False) -> list[tuple[int, str, dict[str, int]]]:
+        """Return (button index, event type, event attributes) of the presses between two snapshots.
+
+        With resync (the controller rebooted, or polls failed in between) the
+        counters of the two snapshots are unrelated or presses are stale:
+        current becomes the new baseline without events.
+        """
+        if previous is None or resync:
+            return []
+        rebooted = previous.up is not None and current.up is not None and current.up < previous.up
+        events = []
+        for category, event_type in (("button", SHORT_PRESS), ("button_long", LONG_PRESS)):
+            for idx, presses in self._presses(previous, current, category, rebooted).items():
+                events.extend(self._events(idx, event_type, presses))
+        return events
+
+    @staticmethod
+    def _presses(previous: StateSnapshot, current: StateSnapshot, category: str, rebooted: bool) -> dict[int, int]:
+        seq_category = SEQ_CATEGORIES[category]
+        presses = {}
+        if seq_category in current.sizes and seq_category in previous.sizes:
+            old = previous.values(seq_category)
+            for i, seq in enumerate(current.values(seq_category)):
+                if i >= len(old) or seq is None or old[i] is None:
+                    continue
+                # counters restart from 0 on reboot
+                count = int(seq) if rebooted else int(seq - old[i]) % PRESS_SEQ_WRAP
+                if count:
+                    presses[i + 1] = count
+            return presses
+        if category not in current.sizes or category not in previous.sizes:
+            return presses
+        rising = getattr(current, category) & ~getattr(previous, category)
+        while rising:
+            low = rising & -rising
+            presses[low.bit_length()] = 1
+            rising ^= low
+        return presses
+
+    def _events(self, idx: int, event_type: str, presses: int) -> list[tuple[int, str, dict[str, int]]]:
+        events = [(idx, event_type, {"presses": presses})]
+        if event_type != SHORT_PRESS:
+            return events
+        now = time.monotonic()
+        last, count = self._last_short.get(idx, (0.0, 0))
+        count = count + presses if now - last <= MULTI_PRESS_WINDOW else presses
+        self._last_short[idx] = (now, count)
+        if count >= 2:
+            events.append((idx, MULTI_PRESS, {"presses": count}))
+        return events
@@ -0,0 +1,144 @@
+"""UDP push receiver for controller input edges."""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+
+from .const import DOMAIN, DATA_PUSH_LISTENERS
+from .state import BINARY_CATEGORIES, NUMERIC_CATEGORIES
+
+if TYPE_CHECKING:
+    from . import STMDeviceDataUpdateCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PushProtocol(asyncio.DatagramProtocol):
+    """Hand received datagrams over to the listener."""
+
+    def __init__(self, listener: PushListener) -> None:
+        self._listener = listener
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        self._listener.handle_datagram(data, addr[0])
+
+
+class PushListener:
+    """Receive partial state datagrams from controllers on one UDP port.
+
+    A controller sends a JSON object with the categories that changed, either
+    as a full list (``{"button": [0, 1, 0]}``) or sparse by 1-based index
+    (``{"button": {"2": 1}}``). Datagrams are routed to the coordinator
+    registered for the sender IP address.
+    """
+
+    def __init__(self, hass: HomeAssistant, port: int) -> None:
+        self._hass = hass
+        self.port = port
+        self._transport: asyncio.DatagramTransport | None = None
+        self._coordinators: dict[str, STMDeviceDataUpdateCoordinator] = {}
+        self.received = 0
+        self.dropped = 0
+
+    async def async_start(self) -> None:
+        self._transport, _ = await self._hass.loop.create_datagram_endpoint(
+            lambda: PushProtocol(self), local_addr=("0.0.0.0", self.port))
+        _LOGGER.info(f"Listening for controller push on UDP port {self.port}")
+
+    @callback
+    def async_stop(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    @callback
+    def register(self, ip_address: str, coordinator: STMDeviceDataUpdateCoordinator) -> None:
+        self._coordinators[ip_address] = coordinator
+
+    @callback
+    def unregister(self, ip_address: str) -> bool:
+        """Forget a controller, returns True when no controllers are left."""
+        self._coordinators.pop(ip_address, None)
+        return not self._coordinators
+
+    @callback
+    def handle_datagram(self, data: bytes, ip_address: str) -> None:
+        coordinator = self._coordinators.get(ip_address)
+        if coordinator is None:
+            self.dropped += 1
+            _LOGGER.debug(f"Push from unknown controller {ip_address} ignored")
+            return
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            self.dropped += 1
+            _LOGGER.debug(f"Invalid push from {ip_address}: {data!r}")
+            return
+        if not isinstance(payload, dict):
+            self.dropped += 1
+            return
+        try:
+            coordinator.async_handle_push(payload)
+        except (TypeError, ValueError, KeyError, OverflowError) as error:
+            # unauthenticated LAN input never reaches the event loop as an exception
+            self.dropped += 1
+            _LOGGER.debug(f"Invalid push from {ip_address}: {data!r}: {error}")
+            return
+        self.received += 1
+
+
+def _valid_push_value(category: str, value: Any) -> bool:
+    if isinstance(value, (int, float)):
+        return True
+    # binary channels may come as "0"/"1"
+    return category in BINARY_CATEGORIES and value in ("0", "1")
+
+
+def parse_push_channels(payload: dict[str, Any]) -> dict[tuple[str, int], Any]:
+    """Flatten a push payload to (category, index) -> value.
+
+    Only channel categories with number (or "0"/"1" for binary channels)
+    values are taken, anything else is skipped.
+    """
+    values = {}
+    for category, channels in payload.items():
+        if category not in BINARY_CATEGORIES and category not in NUMERIC_CATEGORIES:
+            continue
+        if isinstance(channels, list):
+            items = enumerate(channels, 1)
+        elif isinstance(channels, dict):
+            items = channels.items()
+        else:
+            continue
+        for idx, value in items:
+            try:
+                idx = int(idx)
+            except (TypeError, ValueError):
+                continue
+            if idx >= 1 and _valid_push_value(category, value):
+                values[(category, idx)] = value
+    return values
+
+
+async def async_register_push(
+        hass: HomeAssistant, port: int, coordinator: STMDeviceDataUpdateCoordinator
+) -> CALLBACK_TYPE:
+    """Route pushes from the coordinator's controller, starting the port listener if needed."""
+    listeners: dict[int, PushListener] = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_PUSH_LISTENERS, {})
+    if (listener := listeners.get(port)) is None:
+        listener = PushListener(hass, port)
+        await listener.async_start()
+        listeners[port] = listener
+    listener.register(coordinator.ip_address, coordinator)
+
+    @callback
+    def unregister() -> None:
+        if listener.unregister(coordinator.ip_address):
+            listener.async_stop()
+            listeners.pop(port, None)
+
+    return unregister
@@ -0,0 +1,124 @@
+"""Ring buffers of high-rate analog samples and their windowed aggregates."""
+from __future__ import annotations
+
+from array import array
+import math
+from typing import Any, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - Home Assistant ships numpy
+    np = None
+
+# samples kept per channel at most, whatever the window and interval
+SAMPLER_MAX_SIZE = 16384
+AGGREGATES = ("min", "max", "mean", "std")
+
+
+class AnalogSampler:
+    """Fixed-size ring buffer of the analog_in samples of all channels.
+
+    Samples are stored channel-major, in one NumPy array when NumPy is
+    available and in an ``array`` per channel otherwise, with the sample times
+    next to them. ``aggregate`` computes min/max/mean/std of every channel
+    over the samples of the last window, with NumPy in one vectorized pass
+    over all channels. Windows are published back to back, so the entities
+    write one state per window however fast the channels are sampled.
+    """
+
+    def __init__(self, window: float, capacity: int) -> None:
+        self.window = window
+        self.capacity = max(1, min(capacity, SAMPLER_MAX_SIZE))
+        self.channels = 0
+        self.samples = 0
+        self.window_started: float | None = None
+        self._times = array("d", [0.0]) * self.capacity
+        self._buffer: Any = None
+        self._pos = 0
+        self._count = 0
+
+    @classmethod
+    def for_interval(cls, window: float, interval: float) -> AnalogSampler:
+        """A sampler holding one window of samples taken every interval seconds."""
+        return cls(window, math.ceil(window / interval) + 1)
+
+    def _reset(self, channels: int) -> None:
+        """Start over for a controller with a different number of channels."""
+        self.channels = channels
+        if np is not None:
+            self._buffer = np.zeros((channels, self.capacity))
+        else:
+            self._buffer = [array("d", [0.0]) * self.capacity for _ in range(channels)]
+        self._pos = 0
+        self._count = 0
+
+    def add(self, values: Sequence[float], now: float) -> None:
+        """Store one sample of every channel."""
+        if len(values) != self.channels:
+            self._reset(len(values))
+        if not self.channels:
+            return
+        pos = self._pos
+        if np is not None:
+            self._buffer[:, pos] = values
+        else:
+            for channel, value in zip(self._buffer, values):
+                channel[pos] = value
+        self._times[pos] = now
+        self._pos = (pos + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        self.samples += 1
+        if self.window_started is None:
+            self.window_started = now
+
+    def due(self, now: float) -> bool:
+        return self.window_started is not None and now - self.window_started >= self.window
+
+    def _window_size(self, cutoff: float) -> int:
+        """Number of newest samples taken after cutoff."""
+        count = 0
+        pos = self._pos
+        times = self._times
+        while count < self._count and times[(pos - count - 1) % self.capacity] > cutoff:
+            count += 1
+        return count
+
+    def aggregate(self, now: float) -> dict[int, dict[str, float]]:
+        """Aggregates of every channel (1-based) over the last window, starting the next window."""
+        self.window_started = now
+        size = self._window_size(now - self.window)
+        if not size or not self.channels:
+            return {}
+        if np is not None:
+            block = self._buffer[:, (self._pos - size + np.arange(size)) % self.capacity]
+            columns = zip(block.min(axis=1).tolist(), block.max(axis=1).tolist(),
+                          block.mean(axis=1).tolist(), block.std(axis=1).tolist())
+        else:
+            columns = (_aggregate(self._window(channel, size)) for channel in self._buffer)
+        return {
+            idx: {**dict(zip(AGGREGATES, (round(value, 3) for value in column))), "samples": size}
+            for idx, column in enumerate(columns, 1)
+        }
+
+    def _window(self, channel: array, size: int) -> array:
+        pos = self._pos
+        if size <= pos:
+            return channel[pos - size:pos]
+        return channel[self.capacity - (size - pos):] + channel[:pos]
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            "channels": self.channels,
+            "capacity": self.capacity,
+            "window": self.window,
+            "buffered": self._count,
+            "samples": self.samples,
+            "numpy": np is not None,
+        }
+
+
+def _aggregate(values: array) -> tuple[float, float, float, float]:
+    mean = math.fsum(values) / len(values)
+    variance = math.fsum((value - mean) ** 2 for value in values) / len(values)
+    return min(values), max(values), mean, math.sqrt(variance)
@@ -0,0 +1,121 @@
+"""Fleet-wide poll scheduler shared by all controller coordinators."""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+import random
+import time
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import DOMAIN, DATA_SCHEDULER
+
+if TYPE_CHECKING:
+    from . import STMDeviceDataUpdateCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+TICK = dt.timedelta(milliseconds=100)
+MAX_CONCURRENT_POLLS = 8
+# fraction of the interval each poll is randomly moved by
+JITTER = 0.1
+# golden ratio spreads any number of coordinators evenly over the interval
+_PHASE_STEP = 0.6180339887
+
+
+class PollScheduler:
+    """Run coordinator polls from one timer.
+
+    Every registered coordinator gets a phase inside its poll interval so the
+    fleet does not poll in lock-step, each poll is jittered, and no more than
+    ``max_concurrent`` polls are in flight at once.
+    """
+
+    def __init__(self, hass: HomeAssistant, max_concurrent: int = MAX_CONCURRENT_POLLS) -> None:
+        self._hass = hass
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._next_due: dict[STMDeviceDataUpdateCoordinator, float] = {}
+        self._in_flight: set[STMDeviceDataUpdateCoordinator] = set()
+        self._registered = 0
+        self._unsub_tick: CALLBACK_TYPE | None = None
+        self.ticks = 0
+        self.polls = 0
+        self.last_tick_time = 0.0
+        self.max_tick_time = 0.0
+        self.total_tick_time = 0.0
+
+    @callback
+    def register(self, coordinator: STMDeviceDataUpdateCoordinator) -> CALLBACK_TYPE:
+        """Start polling a coordinator, returns a callback to stop."""
+        phase = (self._registered * _PHASE_STEP) % 1
+        self._registered += 1
+        self._next_due[coordinator] = self._hass.loop.time() + coordinator.poll_interval * phase
+        coordinator.scheduler = self
+        if self._unsub_tick is None:
+            self._unsub_tick = async_track_time_interval(self._hass, self._tick, TICK)
+
+        @callback
+        def unregister() -> None:
+            self._next_due.pop(coordinator, None)
+            coordinator.scheduler = None
+            if not self._next_due and self._unsub_tick is not None:
+                self._unsub_tick()
+                self._unsub_tick = None
+
+        return unregister
+
+    @callback
+    def poll_soon(self, coordinator: STMDeviceDataUpdateCoordinator) -> None:
+        """Bring the next poll forward to the coordinator's current interval."""
+        if coordinator in self._next_due:
+            self._next_due[coordinator] = min(self._next_due[coordinator],
+                                              self._hass.loop.time() + coordinator.poll_interval)
+
+    @callback
+    def _tick(self, _now: dt.datetime) -> None:
+        started = time.perf_counter()
+        now = self._hass.loop.time()
+        for coordinator, due in self._next_due.items():
+            if due > now or coordinator in self._in_flight:
+                continue
+            interval = coordinator.poll_interval
+            self._next_due[coordinator] = now + interval * (1 + random.uniform(-JITTER, JITTER))
+            self._in_flight.add(coordinator)
+            self._hass.async_create_background_task(
+                self._poll(coordinator), f"{DOMAIN} poll {coordinator.ip_address}")
+        self.ticks += 1
+        self.last_tick_time = time.perf_counter() - started
+        self.max_tick_time = max(self.max_tick_time, self.last_tick_time)
+        self.total_tick_time += self.last_tick_time
+
+    async def _poll(self, coordinator: STMDeviceDataUpdateCoordinator) -> None:
+        try:
+            async with self._semaphore:
+                self.polls += 1
+                await coordinator.async_refresh()
+        finally:
+            self._in_flight.discard(coordinator)
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            "coordinators": len(self._next_due),
+            "in_flight": len(self._in_flight),
+            "ticks": self.ticks,
+            "polls": self.polls,
+            "last_tick_ms": round(self.last_tick_time * 1000, 3),
+            "max_tick_ms": round(self.max_tick_time * 1000, 3),
+            "avg_tick_ms": round(self.total_tick_time * 1000 / self.ticks, 3) if self.ticks else 0,
+        }
+
+
+@callback
+def async_get_scheduler(hass: HomeAssistant) -> PollScheduler:
+    """Return the scheduler shared by all config entries."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if (scheduler := domain_data.get(DATA_SCHEDULER)) is None:
+        scheduler = domain_data[DATA_SCHEDULER] = PollScheduler(hass)
+    return scheduler
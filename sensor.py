@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from collections.abc import Callable
+from dataclasses import dataclass
 import logging
 
 _LOGGER = logging.getLogger(__name__)
@@ -11,13 +13,110 @@ from homeassistant.components.sensor import (
     SensorStateClass,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import (UnitOfTemperature)
+from homeassistant.const import (PERCENTAGE, Platform, UnitOfTemperature, UnitOfTime, EntityCategory)
 from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from . import STMDeviceDataUpdateCoordinator
-from .const import DOMAIN
+from . import STMDeviceDataUpdateCoordinator, entry_coordinators
+from .const import DOMAIN, CONF_METERS, CONF_METER_UNIT
+from .filters import FILTER_OPTIONS
+from .meters import RATE_UNITS, DEFAULT_RATE_UNIT
+from .metrics import DeviceMetrics
+from .state import channel_accessor, temperature_accessor
+from .stm_device import CircuitBreaker
+
+
+@dataclass(frozen=True, kw_only=True)
+class MetricSensorEntityDescription(SensorEntityDescription):
+    """Describes a diagnostic metric sensor."""
+
+    value_fn: Callable[[DeviceMetrics], float | int | None]
+
+
+# device classes of the total and the rate sensor of a counter by total unit
+METER_DEVICE_CLASSES = {
+    "kWh": (SensorDeviceClass.ENERGY, SensorDeviceClass.POWER),
+    "Wh": (SensorDeviceClass.ENERGY, SensorDeviceClass.POWER),
+    "m³": (SensorDeviceClass.WATER, SensorDeviceClass.VOLUME_FLOW_RATE),
+    "L": (SensorDeviceClass.WATER, SensorDeviceClass.VOLUME_FLOW_RATE),
+}
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+METRIC_SENSORS: tuple[MetricSensorEntityDescription, ...] = (
+    MetricSensorEntityDescription(
+        key="poll_duration",
+        name="Длительность опроса",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda metrics: _ms(metrics.last_poll_duration),
+    ),
+    MetricSensorEntityDescription(
+        key="request_latency_p50",
+        name="Задержка запросов (p50)",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda metrics: _ms(metrics.all_requests.percentile(50)),
+    ),
+    MetricSensorEntityDescription(
+        key="request_latency_p99",
+        name="Задержка запросов (p99)",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda metrics: _ms(metrics.all_requests.percentile(99)),
+    ),
+    MetricSensorEntityDescription(
+        key="command_wait_p99",
+        name="Ожидание команд в очереди (p99)",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda metrics: _ms(metrics.queue_wait["command"].percentile(99))
+        if "command" in metrics.queue_wait else None,
+    ),
+    MetricSensorEntityDescription(
+        key="queue_depth",
+        name="Запросов в очереди",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda metrics: metrics.queue_depth,
+    ),
+    MetricSensorEntityDescription(
+        key="request_errors",
+        name="Ошибки запросов",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda metrics: metrics.errors,
+    ),
+    MetricSensorEntityDescription(
+        key="request_timeouts",
+        name="Таймауты запросов",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda metrics: metrics.timeouts,
+    ),
+    MetricSensorEntityDescription(
+        key="entities_notified",
+        name="Обновлено сущностей за опрос",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda metrics: metrics.last_entities_notified,
+    ),
+    MetricSensorEntityDescription(
+        key="suppression_ratio",
+        name="Доля отброшенных изменений",
+        native_unit_of_measurement=PERCENTAGE,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda metrics: None if metrics.suppression_ratio is None
+        else round(metrics.suppression_ratio * 100, 1),
+    ),
+    MetricSensorEntityDescription(
+        key="reboots",
+        name="Перезагрузки",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda metrics: metrics.reboots,
+    ),
+)
 
 
 async def async_setup_entry(
@@ -25,8 +124,12 @@ async def async_setup_entry(
 ) -> None:
     """Add AccuWeather entities from a config_entry."""
 
-    coordinator: STMDeviceDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    for coordinator in entry_coordinators(hass, entry):
+        coordinator.async_add_entity_factory(entry, Platform.SENSOR, _entities, async_add_entities)
+
 
+def _entities(coordinator: STMDeviceDataUpdateCoordinator, entry: ConfigEntry) -> list[Entity]:
+    """Entities of the channels in the controller's system_info."""
     sensors = []
     if "temperature" in coordinator.system_info:
         for addr in coordinator.system_info["temperature"]["addr"]:
@@ -35,12 +138,50 @@ async def async_setup_entry(
         for i in range(1, coordinator.system_info.get("analog_in") + 1):
             sensors.append(AnalogInSensor(coordinator, i))
     if "counter" in coordinator.system_info:
+        meters = entry.options.get(CONF_METERS, {})
         for i in range(1, coordinator.system_info.get("counter") + 1):
-            sensors.append(MeterSensor(coordinator, i))
-    async_add_entities(sensors)
+            unit = meters.get(f"{i}", {}).get(CONF_METER_UNIT) or None
+            sensors.append(MeterSensor(coordinator, i, unit))
+            sensors.append(MeterRateSensor(coordinator, i, unit))
+    sensors.append(CircuitBreakerSensor(coordinator))
+    for description in METRIC_SENSORS:
+        sensors.append(MetricSensor(coordinator, description))
+    return sensors
 
 
-class TemperatureSensor(CoordinatorEntity, SensorEntity):
+class FilteredSensorMixin:
+    """Publish only significant changes of a noisy channel.
+
+    The filter uses the entry options, overridden by options stored under the
+    integration domain in the entity registry entry of the sensor.
+    """
+    _publish_filter = True
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self._async_update_publish_filter()
+
+    async def async_will_remove_from_hass(self) -> None:
+        if self._publish_filter:
+            self._coordinator.async_remove_publish_filter(self.coordinator_context)
+        await super().async_will_remove_from_hass()
+
+    @callback
+    def async_registry_entry_updated(self) -> None:
+        self._async_update_publish_filter()
+
+    @callback
+    def _async_update_publish_filter(self) -> None:
+        if not self._publish_filter:
+            return
+        entity_options = None
+        if self.registry_entry is not None:
+            options = self.registry_entry.options.get(DOMAIN, {})
+            entity_options = {key: options[key] for key in FILTER_OPTIONS if key in options}
+        self._coordinator.async_set_publish_filter(self.coordinator_context, entity_options)
+
+
+class TemperatureSensor(FilteredSensorMixin, CoordinatorEntity, SensorEntity):
     """Define an Temperature entity."""
     _attr_has_entity_name = True
 
@@ -50,7 +191,7 @@ class TemperatureSensor(CoordinatorEntity, SensorEntity):
             one_wire_addr: str,
     ) -> None:
         """Initialize."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("temperature", one_wire_addr))
         self._attr_unique_id = f"{coordinator.system_info['device_index']}_ds18b20_{one_wire_addr}".lower()
         self._attr_device_info = coordinator.device_info
         self._attr_device_class = SensorDeviceClass.TEMPERATURE
@@ -58,6 +199,7 @@ class TemperatureSensor(CoordinatorEntity, SensorEntity):
         self._attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
         self._attr_state_class = SensorStateClass.MEASUREMENT
         self._one_wire_addr = one_wire_addr
+        self._get_sensor_data = temperature_accessor(one_wire_addr)
         self._attr_native_value = self._get_sensor_data(coordinator.data)
         self._coordinator = coordinator
 
@@ -67,44 +209,44 @@ class TemperatureSensor(CoordinatorEntity, SensorEntity):
         self._attr_native_value = self._get_sensor_data(self._coordinator.data)
         self.async_write_ha_state()
 
-    def _get_sensor_data(self, data):
-        """Get sensor data."""
-        if not "temperature" in data:
-            return None
-        if not self._one_wire_addr in data["temperature"]:
-            return None
-        return data["temperature"][self._one_wire_addr]
-
 
-class AnalogInSensor(CoordinatorEntity, SensorEntity):
+class AnalogInSensor(FilteredSensorMixin, CoordinatorEntity, SensorEntity):
     """Define an Analog input entity."""
     _attr_has_entity_name = True
 
     def __init__(self, coordinator, idx) -> None:
         """Initialize."""
-        super().__init__(coordinator)
+        # sampled inputs publish the mean of every window, min/max/std as attributes
+        self._publish_filter = coordinator.sampler is None
+        super().__init__(coordinator, context=("analog_in" if self._publish_filter else "analog_stats", idx))
         self.idx = idx
         self._attr_unique_id = f"{coordinator.system_info['device_index']}_analog_in_{idx}".lower()
         self._attr_device_info = coordinator.device_info
         self._attr_name = f"Аналоговый вход ({idx})"
         self._attr_state_class = SensorStateClass.MEASUREMENT
-        self._attr_native_value = self._get_sensor_data(coordinator.data)
+        self._get_sensor_data = channel_accessor("analog_in", idx)
         self._coordinator = coordinator
+        self._update_value()
+
+    def _update_value(self) -> None:
+        if self._publish_filter:
+            self._attr_native_value = self._get_sensor_data(self._coordinator.data)
+            return
+        stats = self._coordinator.analog_stats.get(self.idx)
+        if stats is None:
+            # no complete window yet
+            self._attr_native_value = self._get_sensor_data(self._coordinator.data)
+            self._attr_extra_state_attributes = None
+            return
+        self._attr_native_value = stats["mean"]
+        self._attr_extra_state_attributes = {**stats, "window": self._coordinator.sampler.window}
 
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle data update."""
-        self._attr_native_value = self._get_sensor_data(self._coordinator.data)
+        self._update_value()
         self.async_write_ha_state()
 
-    def _get_sensor_data(self, data):
-        """Get sensor data."""
-        if not "analog_in" in data:
-            return None
-        if len(data["analog_in"]) < self.idx:
-            return None
-        return data["analog_in"][(self.idx) - 1]
-
 
 class MeterSensor(CoordinatorEntity, SensorEntity):
     """Define an Meter entity."""
@@ -114,29 +256,128 @@ class MeterSensor(CoordinatorEntity, SensorEntity):
             self,
             coordinator: STMDeviceDataUpdateCoordinator,
             idx: int,
+            unit: str | None,
     ) -> None:
         """Initialize."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("counter", idx))
         self._attr_unique_id = f"{coordinator.system_info['device_index']}_counter_{idx}".lower()
         self._attr_device_info = coordinator.device_info
-        self._attr_device_class = SensorDeviceClass.ENERGY
+        self._attr_device_class = METER_DEVICE_CLASSES.get(unit, (None, None))[0]
         self._attr_name = f"Счётчик ({idx})"
-        # self._attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
+        self._attr_native_unit_of_measurement = unit
         self._attr_state_class = SensorStateClass.TOTAL_INCREASING
         self.idx = idx
-        self._attr_native_value = self._get_sensor_data(coordinator.data)
         self._coordinator = coordinator
+        self._attr_native_value = self._get_sensor_data()
 
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle data update."""
-        self._attr_native_value = self._get_sensor_data(self._coordinator.data)
+        self._attr_native_value = self._get_sensor_data()
         self.async_write_ha_state()
 
-    def _get_sensor_data(self, data):
-        """Get sensor data."""
-        if not "counter" in data:
+    def _get_sensor_data(self):
+        """Total without the resets of the controller counter."""
+        if (tracker := self._coordinator.meters.get(self.idx)) is None:
             return None
-        if len(data["counter"]) < self.idx:
+        return tracker.total
+
+
+class MeterRateSensor(CoordinatorEntity, SensorEntity):
+    """Power or flow computed from a counter."""
+    _attr_has_entity_name = True
+
+    def __init__(
+            self,
+            coordinator: STMDeviceDataUpdateCoordinator,
+            idx: int,
+            unit: str | None,
+    ) -> None:
+        """Initialize."""
+        super().__init__(coordinator, context=("counter_rate", idx))
+        self._attr_unique_id = f"{coordinator.system_info['device_index']}_counter_rate_{idx}".lower()
+        self._attr_device_info = coordinator.device_info
+        self._attr_device_class = METER_DEVICE_CLASSES.get(unit, (None, None))[1]
+        self._attr_name = f"Расход ({idx})"
+        self._attr_native_unit_of_measurement = RATE_UNITS.get(unit, DEFAULT_RATE_UNIT)[0]
+        self._attr_state_class = SensorStateClass.MEASUREMENT
+        self.idx = idx
+        self._coordinator = coordinator
+        self._attr_native_value = self._get_sensor_data()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle data update."""
+        self._attr_native_value = self._get_sensor_data()
+        self.async_write_ha_state()
+
+    def _get_sensor_data(self):
+        """Rate over the last window of controller uptime."""
+        if (tracker := self._coordinator.meters.get(self.idx)) is None:
             return None
-        return data["counter"][(self.idx) - 1]
+        return tracker.rate
+
+
+class CircuitBreakerSensor(CoordinatorEntity, SensorEntity):
+    """Connection circuit breaker state of the controller."""
+    _attr_has_entity_name = True
+
+    def __init__(self, coordinator: STMDeviceDataUpdateCoordinator) -> None:
+        """Initialize."""
+        super().__init__(coordinator, context=("breaker", None))
+        self._attr_unique_id = f"{coordinator.system_info['device_index']}_circuit_breaker".lower()
+        self._attr_device_info = coordinator.device_info
+        self._attr_device_class = SensorDeviceClass.ENUM
+        self._attr_entity_category = EntityCategory.DIAGNOSTIC
+        self._attr_name = "Состояние связи"
+        self._attr_options = [CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN]
+        self._coordinator = coordinator
+        self._attr_native_value = coordinator.device.breaker.state
+
+    @property
+    def available(self) -> bool:
+        """Stay available to show why the controller is not."""
+        return True
+
+    @property
+    def extra_state_attributes(self):
+        breaker = self._coordinator.device.breaker
+        return {"failures": breaker.failures, "opened": breaker.opened}
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        # coordinator updates are not sent while polls keep failing, the breaker reports its transitions itself
+        self.async_on_remove(self._coordinator.device.breaker.add_listener(self._handle_coordinator_update))
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle data update."""
+        self._attr_native_value = self._coordinator.device.breaker.state
+        self.async_write_ha_state()
+
+
+class MetricSensor(CoordinatorEntity, SensorEntity):
+    """Performance metric of the integration for this controller."""
+    _attr_has_entity_name = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    entity_description: MetricSensorEntityDescription
+
+    def __init__(
+            self,
+            coordinator: STMDeviceDataUpdateCoordinator,
+            description: MetricSensorEntityDescription,
+    ) -> None:
+        """Initialize."""
+        super().__init__(coordinator, context=("metrics", None))
+        self.entity_description = description
+        self._attr_unique_id = f"{coordinator.system_info['device_index']}_{description.key}".lower()
+        self._attr_device_info = coordinator.device_info
+        self._coordinator = coordinator
+        self._attr_native_value = description.value_fn(coordinator.device.metrics)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle data update."""
+        self._attr_native_value = self.entity_description.value_fn(self._coordinator.device.metrics)
+        self.async_write_ha_state()
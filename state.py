@@ -0,0 +1,430 @@
+"""Decoding of controller /state responses into compact snapshots."""
+from __future__ import annotations
+
+from array import array
+import json
+from operator import attrgetter
+import struct
+import sys
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - Home Assistant always ships orjson
+    orjson = None
+
+BINARY_CATEGORIES = ("relay", "light", "v_switch", "button", "button_long", "binary_sensor", "v_binary_sensor")
+# array typecode of every numeric category
+NUMERIC_CATEGORIES = {"v_numeric": "d", "analog_in": "d", "counter": "q", "button_seq": "q", "button_long_seq": "q"}
+
+
+# packed binary /state of firmware that answers /state?format=bin, see decode_binary_state
+BINARY_STATE_MAGIC = b"ST"
+BINARY_STATE_VERSION = 1
+# requested only from firmware listing it in system_info["state_formats"], whose 1-Wire
+# addresses in system_info are the lowercase hex of the 8 address bytes
+BINARY_STATE_FORMAT = "bin"
+# section codes of the binary format by category
+BINARY_STATE_SECTIONS = {
+    "relay": 1, "light": 2, "v_switch": 3, "button": 4, "button_long": 5, "binary_sensor": 6, "v_binary_sensor": 7,
+    "v_numeric": 16, "analog_in": 17, "counter": 18, "button_seq": 19, "button_long_seq": 20,
+    "temperature": 32,
+}
+# little-endian wire format of the numeric sections
+BINARY_STATE_WIRE = {"v_numeric": "i", "analog_in": "H", "counter": "I", "button_seq": "H", "button_long_seq": "H"}
+# temperatures are int16 hundredths of a degree, this value marks a failed probe
+TEMPERATURE_SCALE = 100
+TEMPERATURE_MISSING = -32768
+_STATE_HEADER = struct.Struct("<2sBBIB")
+_SECTION_HEADER = struct.Struct("<BBHH")
+_SECTION_CATEGORIES = {code: category for category, code in BINARY_STATE_SECTIONS.items()}
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def loads(raw: bytes) -> Any:
+    """Parse JSON bytes, with orjson when it is available."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+# maps the bytes of a 0/1 list to the digits of a binary literal
+_BIT_DIGITS = bytes.maketrans(bytes(range(256)), b"0" + b"1" * 255)
+
+
+def _pack_bits(values: list[Any]) -> int:
+    """Pack a list of channel states into an int, channel 1 in bit 0."""
+    if not values:
+        return 0
+    try:
+        return int(bytes(values[::-1]).translate(_BIT_DIGITS), 2)
+    except (TypeError, ValueError):
+        # not plain 0/1 numbers
+        bits = 0
+        for i, item in enumerate(values):
+            if item:
+                bits |= 1 << i
+        return bits
+
+
+# channels without a valid value, shared while a snapshot has none
+_NO_INVALID: frozenset[tuple[str, Any]] = frozenset()
+
+
+def _to_array(typecode: str, values: list[Any], category: str, invalid: set[tuple[str, Any]]) -> array:
+    """Numbers of a category, 0 in place of values that are not numbers (their channels go to invalid)."""
+    try:
+        return array(typecode, values)
+    except (TypeError, OverflowError):
+        convert = int if typecode == "q" else float
+        converted = array(typecode)
+        for idx, item in enumerate(values, 1):
+            try:
+                converted.append(convert(item))
+            except (TypeError, ValueError, OverflowError):
+                converted.append(0)
+                invalid.add((category, idx))
+        return converted
+
+
+def _to_temperature(value: Any) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        # a disconnected probe reports null
+        return None
+
+
+class StateSnapshot:
+    """One /state reading of a controller.
+
+    Binary channels are packed into one int bitmask per category (channel 1
+    is bit 0), numeric channels are ``array`` buffers, temperatures a dict by
+    1-Wire address. ``sizes`` holds the channel count of every category the
+    controller reported, ``seq`` the state token of firmware with delta support.
+    ``invalid`` holds the (category, index) of channels reported with a value
+    that is not a number, they read as None; a category that is not a list
+    is left out.
+    """
+
+    __slots__ = ("up", "seq", "sizes", "invalid", "relay", "light", "v_switch", "button", "button_long", "binary_sensor",
+                 "v_binary_sensor", "v_numeric", "analog_in", "counter", "button_seq", "button_long_seq",
+                 "temperature")
+
+    def __init__(self) -> None:
+        self.up: int | None = None
+        self.seq: Any = None
+        self.sizes: dict[str, int] = {}
+        self.invalid: set[tuple[str, Any]] | frozenset[tuple[str, Any]] = _NO_INVALID
+        for category in BINARY_CATEGORIES:
+            setattr(self, category, 0)
+        for category, typecode in NUMERIC_CATEGORIES.items():
+            setattr(self, category, array(typecode))
+        self.temperature: dict[str, float] = {}
+
+    @classmethod
+    def from_payload(cls, payload: dict[str, Any]) -> StateSnapshot:
+        """Build a snapshot from a decoded /state object, ignoring unknown keys."""
+        snapshot = cls()
+        sizes = snapshot.sizes
+        invalid = set()
+        for key, value in payload.items():
+            try:
+                if key in BINARY_CATEGORIES:
+                    setattr(snapshot, key, _pack_bits(value))
+                    sizes[key] = len(value)
+                elif key in NUMERIC_CATEGORIES:
+                    setattr(snapshot, key, _to_array(NUMERIC_CATEGORIES[key], value, key, invalid))
+                    sizes[key] = len(value)
+                elif key == "temperature":
+                    snapshot.temperature = {str(addr): _to_temperature(item) for addr, item in value.items()}
+                    invalid.update(("temperature", addr) for addr, item in snapshot.temperature.items()
+                                   if item is None)
+                    sizes[key] = len(value)
+                elif key == "up":
+                    snapshot.up = int(value)
+                elif key == "seq":
+                    snapshot.seq = value
+            except (TypeError, ValueError, AttributeError):
+                # one broken category does not fail the others
+                invalid.add((key, None))
+        if invalid:
+            snapshot.invalid = invalid
+        return snapshot
+
+    def copy(self) -> StateSnapshot:
+        snapshot = StateSnapshot.__new__(StateSnapshot)
+        snapshot.up = self.up
+        snapshot.seq = self.seq
+        snapshot.sizes = dict(self.sizes)
+        snapshot.invalid = set(self.invalid) if self.invalid else _NO_INVALID
+        for category in BINARY_CATEGORIES:
+            setattr(snapshot, category, getattr(self, category))
+        for category in NUMERIC_CATEGORIES:
+            setattr(snapshot, category, getattr(self, category)[:])
+        snapshot.temperature = dict(self.temperature)
+        return snapshot
+
+    def has(self, category: str, idx: int) -> bool:
+        return self.sizes.get(category, 0) >= idx >= 1
+
+    def get(self, category: str, idx: int) -> Any:
+        """Value of channel idx (1-based), None when the controller has no such channel."""
+        if not self.has(category, idx):
+            return None
+        if category in NUMERIC_CATEGORIES:
+            if self.invalid and (category, idx) in self.invalid:
+                return None
+            return getattr(self, category)[idx - 1]
+        return bool(getattr(self, category) >> (idx - 1) & 1)
+
+    def set(self, category: str, idx: int, value: Any) -> bool:
+        """Change channel idx in place, returns False when it does not exist."""
+        if not self.has(category, idx) or category not in NUMERIC_CATEGORIES and category not in BINARY_CATEGORIES:
+            return False
+        if category in NUMERIC_CATEGORIES:
+            values = getattr(self, category)
+            try:
+                number = int(value) if values.typecode == "q" else float(value)
+            except (TypeError, ValueError, OverflowError):
+                if not self.invalid:
+                    self.invalid = set()
+                self.invalid.add((category, idx))
+                return True
+            if self.invalid:
+                self.invalid.discard((category, idx))
+            if values.typecode == "d":
+                values[idx - 1] = number
+                return True
+            try:
+                if values.typecode != "q" and number != int(number):
+                    raise OverflowError
+                values[idx - 1] = int(number)
+            except OverflowError:
+                # binary states keep the narrow wire types, widen for a value they cannot hold
+                values = array(NUMERIC_CATEGORIES[category], values)
+                setattr(self, category, values)
+                values[idx - 1] = number
+        elif value and value != "0":
+            setattr(self, category, getattr(self, category) | 1 << (idx - 1))
+        else:
+            setattr(self, category, getattr(self, category) & ~(1 << (idx - 1)))
+        return True
+
+    def apply_changes(self, changes: dict[str, Any]) -> bool:
+        """Merge changed channels in the push layout ({"relay": {"3": 1}}) in place.
+
+        Returns False when a change names a channel the snapshot does not
+        have, the snapshot is then partly updated and has to be refetched.
+        A temperature of None removes the probe.
+        """
+        for key, value in changes.items():
+            if key in BINARY_CATEGORIES or key in NUMERIC_CATEGORIES:
+                for idx, item in value.items():
+                    if not self.set(key, int(idx), item):
+                        return False
+            elif key == "temperature":
+                if key not in self.sizes:
+                    return False
+                for addr, item in value.items():
+                    if item is None:
+                        self.temperature.pop(str(addr), None)
+                    else:
+                        self.temperature[str(addr)] = _to_temperature(item)
+                self.sizes[key] = len(self.temperature)
+            elif key == "up":
+                self.up = int(value)
+        return True
+
+    def values(self, category: str) -> list[int | float] | None:
+        """All channels of a category as plain numbers (bits as 0/1)."""
+        if category not in self.sizes:
+            return None
+        if category in NUMERIC_CATEGORIES:
+            values = getattr(self, category).tolist()
+            for invalid_category, idx in self.invalid:
+                if invalid_category == category and idx is not None:
+                    values[idx - 1] = None
+            return values
+        bits = getattr(self, category)
+        return [bits >> i & 1 for i in range(self.sizes[category])]
+
+    def diff(self, other: StateSnapshot) -> set[tuple[str, Any]]:
+        """(category, index) keys that differ from another snapshot.
+
+        Binary categories are compared with one XOR, numeric ones with a
+        single array comparison before looking at individual channels.
+        """
+        changed = set()
+        for category in BINARY_CATEGORIES:
+            size = max(self.sizes.get(category, 0), other.sizes.get(category, 0))
+            bits = getattr(self, category) ^ getattr(other, category)
+            if self.sizes.get(category) != other.sizes.get(category):
+                # channels that appeared or vanished
+                bits |= ((1 << size) - 1) & ~((1 << min(self.sizes.get(category, 0),
+                                                        other.sizes.get(category, 0))) - 1)
+            while bits:
+                low = bits & -bits
+                changed.add((category, low.bit_length()))
+                bits ^= low
+        for category in NUMERIC_CATEGORIES:
+            old = getattr(other, category)
+            new = getattr(self, category)
+            if old == new:
+                continue
+            for i in range(max(len(old), len(new))):
+                if i >= len(old) or i >= len(new) or old[i] != new[i]:
+                    changed.add((category, i + 1))
+        if self.temperature != other.temperature:
+            for addr in self.temperature.keys() | other.temperature.keys():
+                if self.temperature.get(addr) != other.temperature.get(addr):
+                    changed.add(("temperature", addr))
+        if self.invalid or other.invalid:
+            # channels that became valid or invalid, their stored value may not have changed
+            changed.update(key for key in self.invalid ^ other.invalid
+                           if key[0] in NUMERIC_CATEGORIES and key[1] is not None)
+        if self.up != other.up:
+            changed.add(("up", None))
+        return changed
+
+    def as_dict(self) -> dict[str, Any]:
+        """The snapshot in the controller's JSON layout, for diagnostics."""
+        data: dict[str, Any] = {} if self.up is None else {"up": self.up}
+        for category in self.sizes:
+            data[category] = dict(self.temperature) if category == "temperature" else self.values(category)
+        return data
+
+    def __repr__(self) -> str:
+        return f"StateSnapshot({self.as_dict()})"
+
+
+def channel_accessor(category: str, idx: int) -> Callable[[StateSnapshot], Any]:
+    """Return a function reading one channel of a snapshot, bound once per entity."""
+    get = attrgetter(category)
+    position = idx - 1
+    if category in NUMERIC_CATEGORIES:
+        key = (category, idx)
+
+        def get_numeric(snapshot: StateSnapshot) -> int | float | None:
+            try:
+                value = get(snapshot)[position]
+            except IndexError:
+                return None
+            if snapshot.invalid and key in snapshot.invalid:
+                return None
+            return value
+        return get_numeric
+
+    mask = 1 << position
+
+    def get_binary(snapshot: StateSnapshot) -> bool | None:
+        if get(snapshot) & mask:
+            return True
+        # a cleared bit is only "off" if the controller reported the channel
+        return False if snapshot.sizes.get(category, 0) >= idx else None
+    return get_binary
+
+
+def temperature_accessor(addr: str) -> Callable[[StateSnapshot], float | None]:
+    """Return a function reading the temperature of one 1-Wire sensor."""
+    def get_temperature(snapshot: StateSnapshot) -> float | None:
+        return snapshot.temperature.get(addr)
+    return get_temperature
+
+
+def normalize_channel(category: str, value: Any) -> Any:
+    """Convert a single written or pushed channel value to what StateSnapshot.get returns."""
+    if category in BINARY_CATEGORIES:
+        return bool(value) and value != "0"
+    if category in NUMERIC_CATEGORIES and type(value) is not int and type(value) is not float:
+        return float(value)
+    return value
+
+
+def _cast(view: memoryview, wire: str) -> memoryview | array:
+    """Little-endian numbers of a section, without a copy on little-endian hosts."""
+    if _LITTLE_ENDIAN:
+        return view.cast(wire)
+    values = array(wire, bytes(view))
+    values.byteswap()
+    return values
+
+
+def decode_binary_state(raw: bytes) -> StateSnapshot:
+    """Decode a packed binary /state body into a StateSnapshot.
+
+    All numbers are little-endian. A 9 byte header (magic ``ST``, version,
+    flags, uint32 uptime, uint8 length of the ASCII seq token that follows)
+    is followed by sections of ``uint8 code, uint8 reserved, uint16 count,
+    uint16 length`` and their payload: binary categories as bitfields
+    (channel 1 is bit 0 of the first byte), numeric ones as fixed-width ints
+    (BINARY_STATE_WIRE), temperatures as count 8 byte 1-Wire addresses followed
+    by count int16 hundredths of a degree. Sections with unknown codes are
+    skipped. Payloads are read through a memoryview and copied once into the
+    snapshot's ints and arrays, numeric arrays keep the wire typecodes.
+    """
+    try:
+        magic, version, _flags, up, seq_length = _STATE_HEADER.unpack_from(raw)
+    except struct.error as error:
+        raise ValueError("binary state too short") from error
+    if magic != BINARY_STATE_MAGIC or version != BINARY_STATE_VERSION:
+        raise ValueError(f"unsupported binary state {magic!r} version {version}")
+    view = memoryview(raw)
+    snapshot = StateSnapshot()
+    snapshot.up = up
+    offset = _STATE_HEADER.size
+    if seq_length:
+        snapshot.seq = bytes(view[offset:offset + seq_length]).decode("ascii")
+        offset += seq_length
+    sizes = snapshot.sizes
+    size = len(raw)
+    while offset < size:
+        try:
+            code, _, count, length = _SECTION_HEADER.unpack_from(raw, offset)
+        except struct.error as error:
+            raise ValueError("truncated section header") from error
+        offset += _SECTION_HEADER.size
+        end = offset + length
+        if end > size:
+            raise ValueError("truncated section")
+        category = _SECTION_CATEGORIES.get(code)
+        if category in BINARY_CATEGORIES:
+            if length * 8 < count:
+                raise ValueError(f"{category}: {count} channels in {length} bytes")
+            setattr(snapshot, category, int.from_bytes(view[offset:end], "little") & ((1 << count) - 1))
+            sizes[category] = count
+        elif category in NUMERIC_CATEGORIES:
+            values = array(BINARY_STATE_WIRE[category])
+            if length != count * values.itemsize:
+                raise ValueError(f"{category}: {count} channels in {length} bytes")
+            # kept in the wire type, one copy of the payload instead of a conversion per channel
+            values.frombytes(view[offset:end])
+            if not _LITTLE_ENDIAN:
+                values.byteswap()
+            setattr(snapshot, category, values)
+            sizes[category] = count
+        elif category == "temperature":
+            if length != count * 10:
+                raise ValueError(f"temperature: {count} probes in {length} bytes")
+            values = _cast(view[offset + count * 8:end], "h")
+            snapshot.temperature = {
+                view[offset + i * 8:offset + i * 8 + 8].hex(): value / TEMPERATURE_SCALE
+                for i, value in enumerate(values) if value != TEMPERATURE_MISSING
+            }
+            sizes[category] = len(snapshot.temperature)
+        offset = end
+    return snapshot
+
+
+def is_binary_state(raw: bytes) -> bool:
+    return raw[:2] == BINARY_STATE_MAGIC
+
+
+def decode_state(raw: bytes) -> StateSnapshot:
+    """Decode a /state body into a StateSnapshot in one pass, JSON or packed binary."""
+    if is_binary_state(raw):
+        return decode_binary_state(raw)
+    payload = loads(raw)
+    if not isinstance(payload, dict):
+        raise ValueError(f"state is not an object: {type(payload).__name__}")
+    return StateSnapshot.from_payload(payload)
@@ -1,53 +1,400 @@
 # version 0.1 (20240310)
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
 import logging
+import random
+import time
 import aiohttp
 import socket
+from typing import Any, Callable
+
+from .metrics import DeviceMetrics
+from .const import DEFAULT_COALESCE_WINDOW, DEFAULT_MAX_IN_FLIGHT
+from .state import BINARY_STATE_FORMAT, StateSnapshot, decode_binary_state, is_binary_state, loads
 
 _LOGGER = logging.getLogger(__name__)
 
+KEEPALIVE_TIMEOUT = 30
+REQUEST_TIMEOUT = 4
+PROBE_TIMEOUT = 2
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_BACKOFF_MIN = 2
+BREAKER_BACKOFF_MAX = 300
+# request queue lanes, a lower number is served first
+PRIORITY_COMMAND = 0
+PRIORITY_RECONCILE = 1
+PRIORITY_POLL = 2
+PRIORITY_LANES = ("command", "reconcile", "poll")
+
+
+class CircuitBreaker():
+    '''Защита от запросов к недоступному устройству.
+
+    После нескольких ошибок подряд размыкается и отклоняет запросы сразу;
+    по истечении экспоненциальной паузы (с разбросом) пропускает одну
+    пробную попытку (half-open), успех замыкает его снова. Подписчики
+    add_listener вызываются при каждой смене состояния.
+    '''
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 backoff_min: float = BREAKER_BACKOFF_MIN, backoff_max: float = BREAKER_BACKOFF_MAX):
+        self._failure_threshold = failure_threshold
+        self._backoff_min = backoff_min
+        self._backoff_max = backoff_max
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.retry_at = 0.0
+        self._listeners: list[Callable[[], None]] = []
+
+    def add_listener(self, listener: Callable[[], None]) -> Callable[[], None]:
+        '''Подписка на смену состояния, возвращает функцию отписки'''
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def _set_state(self, state: str):
+        if state == self.state:
+            return
+        self.state = state
+        for listener in list(self._listeners):
+            listener()
+
+    def try_half_open(self) -> bool:
+        '''Открыт ли путь для запроса; переводит в half-open, когда пауза истекла'''
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() >= self.retry_at:
+            self._set_state(self.HALF_OPEN)
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened = 0
+        self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self._failure_threshold:
+            backoff = min(self._backoff_max, self._backoff_min * 2 ** self.opened)
+            self.opened += 1
+            self.retry_at = time.monotonic() + random.uniform(backoff / 2, backoff)
+            self._set_state(self.OPEN)
+
+
 class STMDevice():
 
-    def __init__(self, ip_address: str):
+    def __init__(self, ip_address: str, max_connections: int = DEFAULT_MAX_IN_FLIGHT,
+                 coalesce_window: int = DEFAULT_COALESCE_WINDOW, port: int = 80, delta_state: bool = True,
+                 binary_state: bool = True):
         self._ip_address = ip_address
+        self._port = port
+        self._base_url = f"http://{ip_address}" if port == 80 else f"http://{ip_address}:{port}"
         try:
             socket.inet_aton(self._ip_address)
             pass
         except socket.error:
             raise InvalidIP
+        self._max_connections = max_connections
+        self._session: aiohttp.ClientSession | None = None
+        self.connections_created = 0
+        self.connections_reused = 0
+        # окно объединения записей задаётся в мс
+        self._coalesce_window = coalesce_window / 1000
+        self._pending_writes: dict[str, _PendingWrite] = {}
+        self._write_tasks: set[asyncio.Task] = set()
+        self.breaker = CircuitBreaker()
+        self.metrics = DeviceMetrics()
+        # TrafficRecorder of capture.py, when traffic capture is enabled
+        self.recorder = None
+        # requests wait here for one of max_connections slots, commands first
+        self._queue = _RequestQueue(max_connections, self.metrics)
+        self._gets_in_flight: dict[tuple, asyncio.Future] = {}
+        # last full or merged /state of firmware with delta support and when its uptime was read
+        self._delta_state = delta_state
+        self._binary_state = binary_state
+        self._binary_supported = False
+        self._state_base: StateSnapshot | None = None
+        self._state_time = 0.0
 
+    def _get_session(self) -> aiohttp.ClientSession:
+        '''Долгоживущая сессия с keep-alive и ограничением числа соединений'''
+        if self._session is None or self._session.closed:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._on_connection_create)
+            trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+            connector = aiohttp.TCPConnector(limit=self._max_connections,
+                                             keepalive_timeout=KEEPALIVE_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, trace_configs=[trace_config],
+                                                  timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+        return self._session
 
-    async def api_request(self, endpoint: str, method: str, params: dict | None = None):
+    async def _on_connection_create(self, session, trace_config_ctx, params):
+        self.connections_created += 1
+
+    async def _on_connection_reuse(self, session, trace_config_ctx, params):
+        self.connections_reused += 1
+
+    async def close(self):
+        '''Закрытие сессии и всех соединений с устройством'''
+        for pending in self._pending_writes.values():
+            pending.handle.cancel()
+            if not pending.future.done():
+                pending.future.set_exception(ConnectionError(f"Device {self._ip_address} closed"))
+        self._pending_writes.clear()
+        for task in list(self._write_tasks):
+            task.cancel()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self.recorder is not None:
+            await self.recorder.async_flush()
+
+
+    async def api_request(self, endpoint: str, method: str, params: dict | None = None,
+                          priority: int | None = None):
+        body = await self._request_raw(endpoint, method, params, priority)
+        if method == "POST" and not body.strip():
+            # прошивка может отвечать на POST пустым телом
+            return None
+        try:
+            return loads(body)
+        except ValueError as error:
+            raise APIError(f"Request to {self._ip_address} ({endpoint}): invalid JSON") from error
+
+    async def _request_raw(self, endpoint: str, method: str, params: dict | None = None,
+                           priority: int | None = None) -> bytes:
+        '''Запрос к устройству через очередь, возвращает тело ответа без разбора.
+
+        Без явного приоритета POST идёт как команда, GET как опрос. Одновременные
+        одинаковые GET-запросы объединяются в один (single-flight).
+        '''
         if method not in ["GET", "POST"]:
             raise InvalidMethod
+        if priority is None:
+            priority = PRIORITY_POLL if method == "GET" else PRIORITY_COMMAND
+        if method != "GET":
+            return await self._queued(endpoint, method, params, priority)
+        key = (endpoint, tuple(sorted(params.items())) if params else ())
+        if (request := self._gets_in_flight.get(key)) is None:
+            request = asyncio.ensure_future(self._queued(endpoint, method, params, priority))
+            self._gets_in_flight[key] = request
+            request.add_done_callback(lambda done: self._get_done(key, done))
+        else:
+            self.metrics.single_flight_joined += 1
+        # a cancelled caller leaves the request to the others that joined it
+        return await asyncio.shield(request)
 
+    def _get_done(self, key: tuple, request: asyncio.Future) -> None:
+        self._gets_in_flight.pop(key, None)
+        if not request.cancelled():
+            # retrieved here in case every caller was cancelled
+            request.exception()
+
+    async def _queued(self, endpoint: str, method: str, params: dict | None, priority: int) -> bytes:
+        await self._queue.acquire(priority)
+        try:
+            return await self._send(endpoint, method, params)
+        finally:
+            self._queue.release()
+
+    async def _send(self, endpoint: str, method: str, params: dict | None = None) -> bytes:
+        '''Запрос к устройству, возвращает тело ответа без разбора'''
         if not params:
             params = "{}"
 
+        metrics = self.metrics.endpoint(endpoint)
+        if not self.breaker.try_half_open():
+            metrics.rejected += 1
+            raise CircuitOpenError(f"Request to {self._ip_address} ({endpoint}): device is unreachable, "
+                                   f"next attempt in {max(0.0, self.breaker.retry_at - time.monotonic()):.0f} s")
+        if self.breaker.state == CircuitBreaker.HALF_OPEN and not await self.probe():
+            self.breaker.record_failure()
+            metrics.rejected += 1
+            raise CircuitOpenError(f"Request to {self._ip_address} ({endpoint}): device is unreachable")
+
         _LOGGER.info(f"Request: {endpoint} ({method}): {params}")
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.request(method, f"http://{self._ip_address}/{endpoint}",
-                                           params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        # _LOGGER.warning(f"APIError. IP address: {self._ip_address}. Endpoint: {endpoint}. Params: {params}. Status: {response.status} ")
-                        raise APIError(f"Request to {self._ip_address} ({endpoint}): returned code {response.status}")
-            except Exception as error:
-                # _LOGGER.error(f"Error connecting to API. Error: {error}. IP address: {self._ip_address}. Endpoint: {endpoint}. Params: {params}. ")
-                raise ConnectionError(f"Request to {self._ip_address} ({endpoint}): no answer from device")
+        session = self._get_session()
+        started = time.perf_counter()
+        status = None
+        try:
+            async with session.request(method, f"{self._base_url}/{endpoint}",
+                                       params=params) as response:
+                status = response.status
+                if response.status == 200:
+                    body = await response.read()
+                elif response.status == 304:
+                    # /state?since=: nothing changed
+                    body = b""
+                else:
+                    raise APIError(f"Request to {self._ip_address} ({endpoint}): returned code {response.status}")
+        except APIError as error:
+            # the device answered
+            self.breaker.record_success()
+            metrics.errors += 1
+            _LOGGER.debug(f"{error}. Params: {params}")
+            if self.recorder is not None:
+                self.recorder.record(endpoint, method, params, status, time.perf_counter() - started,
+                                     error=str(error))
+            raise
+        except BaseException as error:
+            if self.recorder is not None:
+                self.recorder.record(endpoint, method, params, status, time.perf_counter() - started,
+                                     error=repr(error))
+            self.breaker.record_failure()
+            if isinstance(error, (asyncio.TimeoutError, asyncio.CancelledError)):
+                metrics.timeouts += 1
+            else:
+                metrics.errors += 1
+            if not isinstance(error, Exception):
+                raise
+            _LOGGER.debug(f"Error connecting to {self._ip_address} ({endpoint}): {error!r}. Params: {params}")
+            raise ConnectionError(f"Request to {self._ip_address} ({endpoint}): no answer from device")
+        self.breaker.record_success()
+        latency = time.perf_counter() - started
+        self.metrics.record_request(endpoint, latency, len(body))
+        if self.recorder is not None:
+            self.recorder.record(endpoint, method, params, status, latency, body)
+        return body
+
+    async def probe(self) -> bool:
+        '''Дешёвая проверка доступности: только TCP-соединение'''
+        try:
+            async with asyncio.timeout(PROBE_TIMEOUT):
+                _, writer = await asyncio.open_connection(self._ip_address, self._port)
+        except (OSError, TimeoutError):
+            return False
+        writer.close()
+        return True
+
+    async def write_channel(self, endpoint: str, idx: int, value: Any):
+        '''Запись одного канала.
+
+        Записи в один endpoint, пришедшие в течение окна объединения, уходят
+        одним POST-запросом. Возвращает ответ этого общего запроса.
+        '''
+        pending = self._pending_writes.get(endpoint)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = _PendingWrite(loop.create_future())
+            pending.handle = loop.call_later(self._coalesce_window, self._flush_writes, endpoint)
+            self._pending_writes[endpoint] = pending
+        pending.params[f"{idx}"] = value
+        return await asyncio.shield(pending.future)
+
+    def _flush_writes(self, endpoint: str):
+        pending = self._pending_writes.pop(endpoint)
+        task = asyncio.create_task(self._send_writes(endpoint, pending))
+        self._write_tasks.add(task)
+        task.add_done_callback(lambda done: self._write_done(done, pending))
+
+    def _write_done(self, task: asyncio.Task, pending: _PendingWrite):
+        self._write_tasks.discard(task)
+        if not pending.future.done():
+            # задача отменена close(), в том числе до начала запроса
+            pending.future.set_exception(ConnectionError(f"Device {self._ip_address} closed"))
+
+    async def _send_writes(self, endpoint: str, pending: _PendingWrite):
+        try:
+            result = await self.api_request(endpoint, "POST", pending.params)
+        except Exception as error:
+            if not pending.future.done():
+                pending.future.set_exception(error)
+        else:
+            if not pending.future.done():
+                pending.future.set_result(result)
 
     @property
     async def system_info(self):
         '''Получение системной информации от устройства'''
         data = await self.api_request("system_info", "GET")
+        if not isinstance(data, dict):
+            raise APIError(f"Request to {self._ip_address} (system_info): not an object")
         return data
 
+    def use_system_info(self, system_info: dict[str, Any]) -> None:
+        '''Учесть возможности прошивки: двоичный /state только если она его объявляет'''
+        self._binary_supported = BINARY_STATE_FORMAT in system_info.get("state_formats", ())
+
     @property
     async def state(self):
-        '''Получение самого последнего статуса'''
-        data = await self.api_request("state", "GET")
-        return data
+        '''Получение самого последнего статуса, уже приведённого к типам.
+
+        Прошивка с поддержкой дельт отдаёт в /state токен seq; следующий запрос
+        /state?since=seq получает 304 или только изменившиеся каналы, которые
+        накладываются на кешированный снимок. Если дельта не сходится с кешем,
+        статус запрашивается целиком. Старая прошивка игнорирует since.
+
+        Полный статус запрашивается в упакованном двоичном формате
+        (format=bin), прошивка без его поддержки отвечает JSON.
+        '''
+        delta = self._delta_state and self._state_base is not None and self._state_base.seq is not None
+        body = await self._request_raw("state", "GET", self._state_params(delta))
+        snapshot = self._decode_state(body, delta)
+        if snapshot is None:
+            self.metrics.delta_fallbacks += 1
+            self._state_base = None
+            snapshot = self._decode_state(await self._request_raw("state", "GET", self._state_params(False)), False)
+        return snapshot
+
+    def _state_params(self, delta: bool) -> dict[str, Any] | None:
+        params = {}
+        if delta:
+            params["since"] = self._state_base.seq
+        if self._binary_state and self._binary_supported:
+            params["format"] = BINARY_STATE_FORMAT
+        return params or None
+
+    def _decode_state(self, body: bytes, delta: bool) -> StateSnapshot | None:
+        '''Разбор полного статуса, дельты или 304; None, если дельта не сходится с кешем'''
+        now = time.monotonic()
+        try:
+            if delta and not body:
+                snapshot = self._state_base.copy()
+                if snapshot.up is not None:
+                    snapshot.up += int(now - self._state_time)
+                self.metrics.state_unchanged += 1
+                return snapshot
+            if is_binary_state(body):
+                # always a full state, with the uptime
+                payload = None
+                base = decode_binary_state(body)
+                self.metrics.state_full += 1
+                self.metrics.state_binary += 1
+            elif not isinstance(payload := loads(body), dict):
+                raise ValueError(f"state is not an object: {type(payload).__name__}")
+            elif delta and "since" in payload:
+                base = self._state_base.copy()
+                changes = {key: value for key, value in payload.items() if key not in ("seq", "since")}
+                if not base.apply_changes(changes):
+                    return None
+                self.metrics.invalid_values += len(base.invalid - self._state_base.invalid)
+                base.seq = payload.get("seq")
+                self.metrics.state_delta += 1
+            else:
+                # full state, also the answer to since after a reboot or a gap
+                base = StateSnapshot.from_payload(payload)
+                self.metrics.state_full += 1
+                self.metrics.invalid_values += len(base.invalid)
+        except (ValueError, TypeError, AttributeError) as error:
+            if delta:
+                return None
+            raise APIError(f"Request to {self._ip_address} (state): invalid state") from error
+        if not self._delta_state or base.seq is None:
+            self._state_base = None
+            return base
+        if payload is None or "up" in payload:
+            self._state_time = now
+        self._state_base = base
+        # the coordinator changes its snapshot in place, the cache stays what the controller reported
+        return base.copy()
 
     @property
     async def version(self):
@@ -60,6 +407,75 @@ class STMDevice():
         '''Получение ip'''
         return self._ip_address
 
+    @property
+    def connection_stats(self) -> dict[str, int]:
+        '''Счётчики новых и переиспользованных соединений'''
+        return {
+            "created": self.connections_created,
+            "reused": self.connections_reused,
+        }
+
+
+class _PendingWrite():
+    '''Записи, ожидающие отправки одним запросом'''
+
+    def __init__(self, future: asyncio.Future):
+        self.params: dict[str, Any] = {}
+        self.future = future
+        self.handle: asyncio.TimerHandle | None = None
+        # callers may be cancelled while the merged request is in flight
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+
+class _RequestQueue():
+    '''Ограничение одновременных запросов к устройству с приоритетными полосами.
+
+    Свободный слот получает ожидающий запрос с наименьшим приоритетом, внутри
+    полосы — в порядке очереди. Выполняющийся запрос не прерывается.
+    '''
+
+    def __init__(self, limit: int, metrics: DeviceMetrics):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._metrics = metrics
+
+    async def acquire(self, priority: int):
+        lane = PRIORITY_LANES[priority]
+        if self.in_flight < self.limit and not self.waiting:
+            self.in_flight += 1
+            self._metrics.record_queue_wait(lane, 0.0, 0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        self.waiting += 1
+        self._metrics.record_queue_depth(self.waiting)
+        started = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                self.waiting -= 1
+                self._metrics.record_queue_depth(self.waiting)
+            else:
+                # the slot was handed over while the caller was cancelled
+                self.release()
+            raise
+        self._metrics.record_queue_wait(lane, time.perf_counter() - started, self.waiting)
+
+    def release(self):
+        self.in_flight -= 1
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.in_flight += 1
+                self.waiting -= 1
+                future.set_result(None)
+                break
+        self._metrics.record_queue_depth(self.waiting)
+
 
 class InvalidIP(Exception):
     """Error to indicate there is an invalid IP."""
@@ -71,4 +487,7 @@ class APIError(Exception):
     """Error to indicate there is an error in API response."""
 
 class ConnectionError(Exception):
-    """Error to indicate there is an error in connection."""
\ No newline at end of file
+    """Error to indicate there is an error in connection."""
+
+class CircuitOpenError(ConnectionError):
+    """Error to indicate the device is considered unreachable and was not contacted."""
\ No newline at end of file
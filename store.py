@@ -0,0 +1,53 @@
+"""Persistent per-entry data of a controller."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+STORAGE_VERSION = 1
+SAVE_DELAY = 10
+
+
+class ControllerStore:
+    """Cached system_info and other data that has to survive restarts."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self._store: Store[dict[str, Any]] = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}")
+        self.data: dict[str, Any] = {}
+
+    async def async_load(self) -> None:
+        self.data = await self._store.async_load() or {}
+
+    @callback
+    def async_save(self) -> None:
+        self._store.async_delay_save(lambda: self.data, SAVE_DELAY)
+
+    async def async_save_now(self) -> None:
+        await self._store.async_save(self.data)
+
+    async def async_remove(self) -> None:
+        await self._store.async_remove()
+
+    @property
+    def system_info(self) -> dict[str, Any] | None:
+        return self.data.get("system_info")
+
+    @callback
+    def async_set_system_info(self, system_info: dict[str, Any]) -> None:
+        if self.data.get("system_info") != system_info:
+            self.data["system_info"] = system_info
+            self.async_save()
+
+    @property
+    def works_since(self) -> str | None:
+        return self.data.get("works_since")
+
+    @callback
+    def async_set_works_since(self, works_since: str) -> None:
+        if self.data.get("works_since") != works_since:
+            self.data["works_since"] = works_since
+            self.async_save()
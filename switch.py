@@ -1,11 +1,13 @@
 from __future__ import annotations
 from homeassistant.components.switch import SwitchDeviceClass, SwitchEntity
 from homeassistant.core import HomeAssistant
-from .const import DOMAIN
-from . import STMDeviceDataUpdateCoordinator
+from . import STMDeviceDataUpdateCoordinator, entry_coordinators
+from .state import channel_accessor
 import logging
 
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import Platform
+from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.helpers.restore_state import RestoreEntity
@@ -20,8 +22,12 @@ async def async_setup_entry(
 ) -> None:
     """Add AccuWeather entities from a config_entry."""
 
-    coordinator: STMDeviceDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    for coordinator in entry_coordinators(hass, entry):
+        coordinator.async_add_entity_factory(entry, Platform.SWITCH, _entities, async_add_entities)
 
+
+def _entities(coordinator: STMDeviceDataUpdateCoordinator, entry: ConfigEntry) -> list[Entity]:
+    """Entities of the channels in the controller's system_info."""
     switches = []
     if "relay" in coordinator.system_info:
         for i in range(1, coordinator.system_info.get("relay") + 1):
@@ -29,7 +35,7 @@ async def async_setup_entry(
     if "v_switch" in coordinator.system_info:
         for i in range(1, coordinator.system_info.get("v_switch") + 1):
             switches.append(VirtualSwitch(coordinator, i))
-    async_add_entities(switches)
+    return switches
 
 
 class RelaySwitch(CoordinatorEntity, RestoreEntity, SwitchEntity):
@@ -38,25 +44,24 @@ class RelaySwitch(CoordinatorEntity, RestoreEntity, SwitchEntity):
 
     def __init__(self, coordinator, idx) -> None:
         """Initialize the switch."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("relay", idx))
         self.idx = idx
         self._attr_unique_id = f"{coordinator.system_info['device_index']}_relay_{idx}".lower()
         self._attr_device_info = coordinator.device_info
         self._attr_name = f"Реле {idx}"
         self._coordinator = coordinator
+        self._get_switch_data = channel_accessor("relay", idx)
         self._attr_is_on = self._get_switch_data(coordinator.data)
 
     async def async_turn_on(self, **kwargs) -> None:
         """Turn the switch on."""
         if "relay" in self._coordinator.system_info and self._coordinator.system_info["relay"] >= self.idx:
-            await self._coordinator.device.api_request("relay", "POST", {f"{self.idx}": 1})
-            # await self._coordinator.async_request_refresh()
+            await self._coordinator.async_write_channel("relay", self.idx, 1)
 
     async def async_turn_off(self, **kwargs) -> None:
         """Turn the device off."""
         if "relay" in self._coordinator.system_info and self._coordinator.system_info["relay"] >= self.idx:
-            await self._coordinator.device.api_request("relay", "POST", {f"{self.idx}": 0})
-            # await self._coordinator.async_request_refresh()
+            await self._coordinator.async_write_channel("relay", self.idx, 0)
 
     @callback
     def _handle_coordinator_update(self) -> None:
@@ -64,13 +69,6 @@ class RelaySwitch(CoordinatorEntity, RestoreEntity, SwitchEntity):
         self._attr_is_on = self._get_switch_data(self._coordinator.data)
         self.async_write_ha_state()
 
-    def _get_switch_data(self, data):
-        """Get switch data."""
-        if not "relay" in data:
-            return None
-        if len(data["relay"]) < self.idx:
-            return None
-        return bool(data["relay"][(self.idx) - 1])
 
     async def async_added_to_hass(self) -> None:
         """Restore on startup."""
@@ -79,8 +77,7 @@ class RelaySwitch(CoordinatorEntity, RestoreEntity, SwitchEntity):
         if not (last_state := await self.async_get_last_state()):
             return
         self._attr_is_on = True if last_state.state == "on" else False
-        if self._attr_is_on:
-            await self._coordinator.device.api_request("relay", "POST", {f"{self.idx}": 1})
+        self._coordinator.async_seed_desired("relay", self.idx, int(self._attr_is_on))
 
 class VirtualSwitch(CoordinatorEntity, RestoreEntity, SwitchEntity):
     """Representation of a virtual switch."""
@@ -88,23 +85,22 @@ class VirtualSwitch(CoordinatorEntity, RestoreEntity, SwitchEntity):
 
     def __init__(self, coordinator, idx) -> None:
         """Initialize the switch."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("v_switch", idx))
         self.idx = idx
         self._attr_unique_id = f"{coordinator.system_info['device_index']}_virtual_{idx}".lower()
         self._attr_device_info = coordinator.device_info
         self._attr_name = f"Виртуальный выключатель {idx}"
         self._coordinator = coordinator
+        self._get_switch_data = channel_accessor("v_switch", idx)
         self._attr_is_on = self._get_switch_data(coordinator.data)
 
     async def async_turn_on(self, **kwargs) -> None:
         """Turn the switch on."""
-        await self._coordinator.device.api_request("v_switch", "POST", {f"{self.idx}": 1})
-        # await self._coordinator.async_request_refresh()
+        await self._coordinator.async_write_channel("v_switch", self.idx, 1)
 
     async def async_turn_off(self, **kwargs) -> None:
         """Turn the device off."""
-        await self._coordinator.device.api_request("v_switch", "POST", {f"{self.idx}": 0})
-        # await self._coordinator.async_request_refresh()
+        await self._coordinator.async_write_channel("v_switch", self.idx, 0)
 
     @callback
     def _handle_coordinator_update(self) -> None:
@@ -112,13 +108,6 @@ class VirtualSwitch(CoordinatorEntity, RestoreEntity, SwitchEntity):
         self._attr_is_on = self._get_switch_data(self._coordinator.data)
         self.async_write_ha_state()
 
-    def _get_switch_data(self, data):
-        """Get switch data."""
-        if not "v_switch" in data:
-            return None
-        if len(data["v_switch"]) < self.idx:
-            return None
-        return bool(data["v_switch"][(self.idx) - 1])
 
     async def async_added_to_hass(self) -> None:
         """Restore on startup."""
@@ -127,5 +116,4 @@ class VirtualSwitch(CoordinatorEntity, RestoreEntity, SwitchEntity):
         if not (last_state := await self.async_get_last_state()):
             return
         self._attr_is_on = True if last_state.state == "on" else False
-        if self._attr_is_on:
-            await self._coordinator.device.api_request("v_switch", "POST", {f"{self.idx}": 1})
+        self._coordinator.async_seed_desired("v_switch", self.idx, int(self._attr_is_on))
@@ -0,0 +1,401 @@
+"""Benchmark the integration against a simulated controller fleet.
+
+Starts ``tools/fake_controller.py`` in a separate process (so its CPU is not
+measured), sets up the real coordinator, poll scheduler and platform entity
+classes for every simulated controller and reports, per fleet size:
+
+* polls per second and poll duration,
+* p50/p99 latency of relay commands,
+* process CPU time per poll (the HA side only),
+* entity state writes per second,
+* peak RSS, each fleet runs in its own process.
+
+It also compares the CPU and memory of one poll of a 64-channel controller
+with dict-of-lists state and with StateSnapshot, and a full /state decode with merging a
+one-channel delta, and a JSON /state with the packed binary one in size and decode time
+(``--decode-only`` runs just these, without Home Assistant). ``--no-delta`` and ``--no-binary``
+run the fleet as firmware without ``/state?since=`` and ``/state?format=bin``.
+
+Entities are driven through their coordinator listeners; ``async_write_ha_state``
+is replaced by a counter, so state machine costs of HA itself are not part of
+the numbers. Requires Home Assistant to be installed. Run it from any
+directory::
+
+    python tools/benchmark.py --fleets 1,10,100,500 --duration 30 --output bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import importlib
+import importlib.util
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+PACKAGE_DIR = Path(__file__).resolve().parents[1]
+PLATFORM_MODULES = ("sensor", "switch", "button", "binary_sensor", "number", "datetime", "light", "event")
+
+
+def import_integration():
+    """Import the integration package by its directory name."""
+    sys.path.insert(0, str(PACKAGE_DIR.parent))
+    return importlib.import_module(PACKAGE_DIR.name)
+
+
+def load_module(name: str):
+    """Load a single dependency-free module of the integration by file."""
+    spec = importlib.util.spec_from_file_location(f"_bench_{name}", PACKAGE_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+class Fleet:
+    """Fake controllers running in a child process."""
+
+    def __init__(self, count: int, base_port: int, args: argparse.Namespace) -> None:
+        self.count = count
+        self.base_port = base_port
+        self._args = args
+        self._process: asyncio.subprocess.Process | None = None
+
+    async def __aenter__(self) -> Fleet:
+        self._process = await asyncio.create_subprocess_exec(
+            sys.executable, str(PACKAGE_DIR / "tools" / "fake_controller.py"),
+            "--count", str(self.count), "--port", str(self.base_port), "--channels", str(self._args.channels),
+            "--latency", str(self._args.latency), "--error-rate", str(self._args.error_rate),
+            "--reboot-every", str(self._args.reboot_every), *(["--no-delta"] if self._args.no_delta else []),
+            *(["--no-binary"] if self._args.no_binary else []),
+            stdout=asyncio.subprocess.PIPE)
+        line = await asyncio.wait_for(self._process.stdout.readline(), 60)
+        if not line.startswith(b"ready"):
+            raise RuntimeError(f"fake controller fleet did not start: {line!r}")
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._process.terminate()
+        await self._process.wait()
+
+
+async def add_entities(hass, integration, coordinator, entry_id: str, options: dict, on_write) -> list:
+    """Create the platform entities of a coordinator and wire them to its listeners."""
+    const = importlib.import_module(f"{integration.__name__}.const")
+    entry = SimpleNamespace(entry_id=entry_id, options=options, data={})
+    hass.data.setdefault(const.DOMAIN, {})[entry.entry_id] = coordinator
+    added = []
+    for name in PLATFORM_MODULES:
+        module = importlib.import_module(f"{integration.__name__}.{name}")
+        await module.async_setup_entry(hass, entry, added.extend)
+    for entity in added:
+        entity.hass = hass
+        entity.async_write_ha_state = on_write
+        coordinator.async_add_listener(entity._handle_coordinator_update, entity.coordinator_context)
+    return added
+
+
+async def run_fleet(integration, count: int, args: argparse.Namespace) -> dict:
+    from homeassistant.core import HomeAssistant
+
+    const = importlib.import_module(f"{integration.__name__}.const")
+    scheduler_module = importlib.import_module(f"{integration.__name__}.scheduler")
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    async with Fleet(count, args.base_port, args):
+        hass = HomeAssistant(tempfile.mkdtemp())
+        scheduler = scheduler_module.async_get_scheduler(hass)
+        options = {const.CONF_FAST_INTERVAL: args.fast_interval, const.CONF_IDLE_INTERVAL: args.idle_interval}
+        coordinators = []
+        unregister = []
+        writes = 0
+        entities = 0
+
+        def count_write() -> None:
+            nonlocal writes
+            writes += 1
+
+        for i in range(count):
+            device = integration.STMDevice("127.0.0.1", port=args.base_port + i, delta_state=not args.no_delta,
+                                           binary_state=not args.no_binary)
+            coordinator = integration.STMDeviceDataUpdateCoordinator(hass, device, "127.0.0.1", None, options)
+            await coordinator.async_refresh()
+            entities += len(await add_entities(hass, integration, coordinator, f"bench_{i}", options, count_write))
+            coordinator.desired_ready = True
+            unregister.append(scheduler.register(coordinator))
+            coordinators.append(coordinator)
+
+        polls_before = sum(c.device.metrics.polls for c in coordinators)
+        writes = 0
+        command_latencies = []
+
+        async def send_commands() -> None:
+            while True:
+                await asyncio.sleep(random.expovariate(args.command_rate))
+                coordinator = random.choice(coordinators)
+                started = time.perf_counter()
+                try:
+                    await coordinator.async_write_channel("relay", random.randint(1, args.channels),
+                                                          random.randint(0, 1))
+                except Exception:  # noqa: BLE001 - errors are counted in the device metrics
+                    continue
+                command_latencies.append(time.perf_counter() - started)
+
+        commands = asyncio.create_task(send_commands()) if args.command_rate else None
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        if commands is not None:
+            commands.cancel()
+
+        polls = sum(c.device.metrics.polls for c in coordinators) - polls_before
+        poll_durations = [c.device.metrics.poll_duration for c in coordinators]
+        result = {
+            "controllers": count,
+            "entities": entities,
+            "duration_s": round(elapsed, 2),
+            "polls": polls,
+            "polls_per_s": round(polls / elapsed, 2),
+            "poll_duration_mean_ms": round(
+                sum(h.total for h in poll_durations) / max(1, sum(h.count for h in poll_durations)) * 1000, 3),
+            "commands": len(command_latencies),
+            "command_p50_ms": _ms(percentile(command_latencies, 50)),
+            "command_p99_ms": _ms(percentile(command_latencies, 99)),
+            "cpu_ms_per_poll": round(cpu * 1000 / polls, 3) if polls else None,
+            "cpu_share": round(cpu / elapsed, 4),
+            "state_writes_per_s": round(writes / elapsed, 2),
+            "request_errors": sum(c.device.metrics.errors for c in coordinators),
+            "request_timeouts": sum(c.device.metrics.timeouts for c in coordinators),
+            "state_full": sum(c.device.metrics.state_full for c in coordinators),
+            "state_delta": sum(c.device.metrics.state_delta for c in coordinators),
+            "state_unchanged": sum(c.device.metrics.state_unchanged for c in coordinators),
+            "state_binary": sum(c.device.metrics.state_binary for c in coordinators),
+            "max_queue_depth": max((c.device.metrics.max_queue_depth for c in coordinators), default=0),
+            "single_flight_joined": sum(c.device.metrics.single_flight_joined for c in coordinators),
+            "scheduler": scheduler.stats,
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "fleet_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+        }
+        for stop in unregister:
+            stop()
+        for coordinator in coordinators:
+            await coordinator.device.close()
+        return result
+
+
+def run_fleet_process(count: int, args: argparse.Namespace) -> dict:
+    """Run one fleet in a fresh interpreter, so its peak RSS is not that of earlier fleets."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_run_fleet_in_process, count, args).result()
+
+
+def _run_fleet_in_process(count: int, args: argparse.Namespace) -> dict:
+    return asyncio.run(run_fleet(import_integration(), count, args))
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def bench_decode(channels: int, iterations: int) -> dict:
+    """Decode a /state body, diff it with the previous poll and read the changed channels like the entities do."""
+    state_module = load_module("state")
+    binary, numeric = state_module.BINARY_CATEGORIES, state_module.NUMERIC_CATEGORIES
+    sample = {category: [random.randint(0, 1) for _ in range(channels)] for category in binary}
+    sample.update({category: [random.randint(0, 1000) for _ in range(channels)] for category in numeric})
+    sample["temperature"] = {f"28ff{i:012x}": round(random.uniform(15, 30), 2) for i in range(channels // 8)}
+    sample["up"] = 12345
+    sample["unused"] = "x" * 32
+    body = json.dumps(sample).encode()
+
+    def legacy_getter(category, idx):
+        # the per-entity _get_*_data methods before snapshots
+        def get(data):
+            if category not in data:
+                return None
+            if len(data[category]) < idx:
+                return None
+            return data[category][idx - 1]
+        return get
+
+    categories = binary + tuple(numeric)
+    keys = [(category, idx) for category in categories for idx in range(1, channels + 1)]
+    # the next poll differs in a few channels, only their entities are read
+    changed_sample = json.loads(body)
+    for category in random.sample(categories, 3):
+        changed_sample[category][random.randrange(channels)] ^= 1
+    previous_body, body = body, json.dumps(changed_sample).encode()
+    legacy_getters = {key: legacy_getter(*key) for key in keys}
+    legacy_previous = json.loads(previous_body)
+
+    def legacy() -> None:
+        # response.json(), the dict-of-lists diff and the getters of changed entities
+        data = json.loads(body.decode())
+        for category in data.keys() | legacy_previous.keys():
+            old, new = legacy_previous.get(category), data.get(category)
+            if old != new and isinstance(new, list):
+                for i in range(len(new)):
+                    if i >= len(old) or old[i] != new[i]:
+                        legacy_getters[(category, i + 1)](data)
+
+    # bound once per entity, like the platforms do
+    accessors = {key: state_module.channel_accessor(*key) for key in keys}
+    previous = state_module.decode_state(previous_body)
+
+    def decoded() -> None:
+        data = state_module.decode_state(body)
+        for key in data.diff(previous):
+            if key in accessors:
+                accessors[key](data)
+
+    result = {
+        "channels": channels,
+        "body_bytes": len(body),
+        "orjson": state_module.orjson is not None,
+        "legacy_bytes": _deep_size(legacy_previous),
+        "snapshot_bytes": _deep_size(previous),
+    }
+    for name, function in (("legacy", legacy), ("snapshot", decoded)):
+        cpu_started = time.process_time()
+        for _ in range(iterations):
+            function()
+        result[f"{name}_us_per_poll"] = round((time.process_time() - cpu_started) * 1e6 / iterations, 2)
+    return result
+
+
+def bench_delta(channels: int, iterations: int) -> dict:
+    """Decode a full /state body against merging a delta with one changed counter into the cached snapshot."""
+    state_module = load_module("state")
+    sample = {category: [random.randint(0, 1) for _ in range(channels)] for category in state_module.BINARY_CATEGORIES}
+    sample.update({category: [random.randint(0, 1000) for _ in range(channels)]
+                   for category in state_module.NUMERIC_CATEGORIES})
+    sample["temperature"] = {f"28ff{i:012x}": round(random.uniform(15, 30), 2) for i in range(channels // 8)}
+    sample["up"] = 12345
+    sample["seq"] = "0000abcd-41"
+    body = json.dumps(sample).encode()
+    delta_body = json.dumps({"since": "0000abcd-41", "seq": "0000abcd-42", "up": 12346,
+                             "counter": {"3": sample["counter"][2] + 1}}).encode()
+    base = state_module.decode_state(body)
+
+    def full() -> None:
+        state_module.decode_state(body)
+
+    def delta() -> None:
+        payload = state_module.loads(delta_body)
+        merged = base.copy()
+        merged.apply_changes({key: value for key, value in payload.items() if key not in ("seq", "since")})
+        merged.copy()
+
+    def unchanged() -> None:
+        # 304: the cached snapshot is copied for the coordinator
+        base.copy()
+
+    result = {"channels": channels, "full_bytes": len(body), "delta_bytes": len(delta_body)}
+    for name, function in (("full", full), ("delta", delta), ("unchanged", unchanged)):
+        cpu_started = time.process_time()
+        for _ in range(iterations):
+            function()
+        result[f"{name}_us_per_poll"] = round((time.process_time() - cpu_started) * 1e6 / iterations, 2)
+    return result
+
+
+def bench_binary(channels: int, iterations: int) -> dict:
+    """Decode the same /state as JSON and in the packed binary format of the reference encoder."""
+    from binary_state import encode_binary_state
+
+    state_module = load_module("state")
+    sample = {category: [random.randint(0, 1) for _ in range(channels)] for category in state_module.BINARY_CATEGORIES}
+    sample["v_numeric"] = [random.randint(0, 100) for _ in range(channels)]
+    sample["analog_in"] = [random.randint(0, 4095) for _ in range(channels)]
+    sample["counter"] = [random.randint(0, 10 ** 6) for _ in range(channels)]
+    sample["button_seq"] = [random.randint(0, 65535) for _ in range(channels)]
+    sample["button_long_seq"] = [random.randint(0, 65535) for _ in range(channels)]
+    sample["temperature"] = {f"28ff{i:012x}": round(random.uniform(15, 30), 2) for i in range(channels // 8)}
+    sample["up"] = 12345
+    sample["seq"] = "0000abcd-41"
+    json_body = json.dumps(sample).encode()
+    binary_body = encode_binary_state(sample)
+    from_json = state_module.decode_state(json_body)
+    from_binary = state_module.decode_state(binary_body)
+    result = {
+        "channels": channels,
+        "json_bytes": len(json_body),
+        "binary_bytes": len(binary_body),
+        "identical": not from_json.diff(from_binary) and from_json.seq == from_binary.seq,
+    }
+    for name, body in (("json", json_body), ("binary", binary_body)):
+        cpu_started = time.process_time()
+        for _ in range(iterations):
+            state_module.decode_state(body)
+        result[f"{name}_us_per_poll"] = round((time.process_time() - cpu_started) * 1e6 / iterations, 2)
+    return result
+
+
+def _deep_size(value) -> int:
+    """Approximate memory held by a decoded state."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(key) + _deep_size(item) for key, item in value.items())
+    elif isinstance(value, list):
+        size += sum(_deep_size(item) for item in value)
+    elif hasattr(value, "__slots__"):
+        size += sum(_deep_size(getattr(value, name)) for name in value.__slots__)
+    return size
+
+
+async def main(args: argparse.Namespace) -> dict:
+    results = {
+        "python": platform.python_version(),
+        "args": vars(args),
+        "decode": bench_decode(64, args.decode_iterations),
+        "delta": bench_delta(64, args.decode_iterations),
+        "binary": bench_binary(64, args.decode_iterations),
+        "fleets": [],
+    }
+    if args.decode_only:
+        return results
+    for count in (int(size) for size in args.fleets.split(",")):
+        print(f"fleet of {count}...", file=sys.stderr)
+        results["fleets"].append(run_fleet_process(count, args))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fleets", default="1,10,100,500", help="comma separated fleet sizes")
+    parser.add_argument("--duration", type=float, default=30, help="measurement time per fleet, s")
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--base-port", type=int, default=18080)
+    parser.add_argument("--latency", type=float, default=5, help="mean controller latency, ms")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--reboot-every", type=float, default=0)
+    parser.add_argument("--command-rate", type=float, default=2, help="relay commands per second, fleet-wide")
+    parser.add_argument("--fast-interval", type=int, default=250, help="ms")
+    parser.add_argument("--idle-interval", type=int, default=2, help="s")
+    parser.add_argument("--decode-iterations", type=int, default=2000)
+    parser.add_argument("--decode-only", action="store_true", help="only time /state decoding")
+    parser.add_argument("--no-delta", action="store_true", help="poll full /state, also in the fake controllers")
+    parser.add_argument("--no-binary", action="store_true", help="poll JSON /state, also in the fake controllers")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    arguments = parser.parse_args()
+    report = json.dumps(asyncio.run(main(arguments)), indent=2)
+    if arguments.output:
+        Path(arguments.output).write_text(report)
+    else:
+        print(report)
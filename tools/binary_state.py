@@ -0,0 +1,37 @@
+"""Reference encoder of the packed binary /state format, without dependencies.
+
+Shared by ``fake_controller.py`` and the decode benchmark of ``benchmark.py``.
+"""
+from __future__ import annotations
+
+import struct
+
+# packed binary /state: section code and little-endian wire format per category, None for bitfields
+BINARY_SECTIONS = {
+    "relay": (1, None), "light": (2, None), "v_switch": (3, None), "button": (4, None), "button_long": (5, None),
+    "binary_sensor": (6, None), "v_binary_sensor": (7, None), "v_numeric": (16, "i"), "analog_in": (17, "H"),
+    "counter": (18, "I"), "button_seq": (19, "H"), "button_long_seq": (20, "H"),
+}
+TEMPERATURE_SECTION = 32
+
+
+def encode_binary_state(state: dict) -> bytes:
+    """Pack a /state document like the firmware does for /state?format=bin."""
+    seq = str(state.get("seq", "")).encode("ascii")
+    parts = [struct.pack("<2sBBIB", b"ST", 1, 0, state.get("up", 0), len(seq)), seq]
+    for category, (code, wire) in BINARY_SECTIONS.items():
+        if (values := state.get(category)) is None:
+            continue
+        if wire is None:
+            bits = sum(1 << i for i, value in enumerate(values) if value)
+            payload = bits.to_bytes((len(values) + 7) // 8, "little")
+        else:
+            payload = struct.pack(f"<{len(values)}{wire}", *(int(value) for value in values))
+        parts.append(struct.pack("<BBHH", code, 0, len(values), len(payload)))
+        parts.append(payload)
+    if (temperature := state.get("temperature")) is not None:
+        payload = b"".join(bytes.fromhex(addr) for addr in temperature) + struct.pack(
+            f"<{len(temperature)}h", *(round(value * 100) for value in temperature.values()))
+        parts.append(struct.pack("<BBHH", TEMPERATURE_SECTION, 0, len(temperature), len(payload)))
+        parts.append(payload)
+    return b"".join(parts)
@@ -0,0 +1,259 @@
+"""Simulated STM32F103 controller for local testing.
+
+Implements the HTTP API used by STMDevice (``/system_info``, ``/state`` and
+the POST channel endpoints) and sends UDP push datagrams on input edges.
+``/state`` carries a ``seq`` token; ``/state?since=<seq>`` answers 304 when
+nothing changed, the changed channels (``{"since": ..., "seq": ..., "up": ...,
+"relay": {"3": 1}}``) or the full state after a reboot or once the change log
+no longer reaches back to the token. ``/state?format=bin`` answers full states
+in the packed binary format (``encode_binary_state`` of ``binary_state.py``
+is the reference encoder). ``--no-delta`` and ``--no-binary`` serve older firmware.
+
+    python tools/fake_controller.py --host 127.0.0.2 --port 8080 --push 127.0.0.1:8790
+
+Add a config entry with the host and port and set the entry's push port
+option to receive button edges. ``--count`` serves a fleet on consecutive
+ports, ``--latency``, ``--error-rate`` and ``--reboot-every`` inject slow
+answers, HTTP 500 errors and reboots.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections import deque
+import json
+import random
+import time
+
+from aiohttp import web
+
+from binary_state import encode_binary_state
+
+WRITABLE = ("relay", "light", "v_switch", "v_numeric")
+# channel changes kept for /state?since=
+CHANGE_LOG_SIZE = 256
+
+
+class FakeController:
+    """In-memory controller state served over aiohttp."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080, device_index: str | None = None,
+                 channels: int = 8, temperatures: int = 2, push_target: tuple[str, int] | None = None,
+                 echo: bool = False, latency: float = 0, error_rate: float = 0, reboot_every: float = 0,
+                 press_seq: bool = True, delta: bool = True, binary: bool = True) -> None:
+        self.host = host
+        self.port = port
+        self.push_target = push_target
+        self.echo = echo
+        self.latency = latency
+        self.error_rate = error_rate
+        self.reboot_every = reboot_every
+        self.delta = delta
+        self.binary = binary
+        self.booted = time.monotonic()
+        # state tokens are "<boot id>-<change number>", so a token of a previous boot never matches
+        self.boot_id = random.getrandbits(32)
+        self.change_number = 0
+        self.changes: deque[tuple[int, str, str]] = deque(maxlen=CHANGE_LOG_SIZE)
+        self.system_info = {
+            "device_index": device_index or f"fake_{host.replace('.', '_')}_{port}",
+            "version": 12,
+            "state_formats": ["json", "bin"] if binary else ["json"],
+            "relay": channels,
+            "light": channels,
+            "v_switch": channels,
+            "v_numeric": channels,
+            "v_numeric_min": [0] * channels,
+            "v_numeric_max": [100] * channels,
+            "v_button": channels,
+            "button": channels,
+            "binary_sensor": channels,
+            "v_binary_sensor": channels,
+            "analog_in": channels,
+            "counter": channels,
+            "temperature": {"addr": [f"28ff{i:012x}" for i in range(temperatures)]},
+        }
+        self.channels = {
+            category: [0] * channels
+            for category in ("relay", "light", "v_switch", "v_numeric", "button", "button_long",
+                             "binary_sensor", "v_binary_sensor", "analog_in", "counter")
+        }
+        if press_seq:
+            # press sequence counters of newer firmware
+            self.channels["button_seq"] = [0] * channels
+            self.channels["button_long_seq"] = [0] * channels
+        self.temperature = {addr: 21.5 for addr in self.system_info["temperature"]["addr"]}
+        self.requests = 0
+        self._runner: web.AppRunner | None = None
+        self._push: asyncio.DatagramTransport | None = None
+
+    @property
+    def up(self) -> int:
+        if self.reboot_every and time.monotonic() - self.booted >= self.reboot_every:
+            self.reboot()
+        return int(time.monotonic() - self.booted)
+
+    def reboot(self) -> None:
+        """Lose all volatile channels like the real board does."""
+        self.booted = time.monotonic()
+        for category in WRITABLE + ("button_seq", "button_long_seq"):
+            if category in self.channels:
+                self.channels[category] = [0] * len(self.channels[category])
+        self.boot_id = random.getrandbits(32)
+        self.change_number = 0
+        self.changes.clear()
+
+    @property
+    def seq(self) -> str:
+        return f"{self.boot_id:08x}-{self.change_number}"
+
+    def changed(self, category: str, key: str) -> None:
+        """Log a channel change for delta answers."""
+        self.change_number += 1
+        self.changes.append((self.change_number, category, key))
+
+    @web.middleware
+    async def _inject(self, request: web.Request, handler):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            raise web.HTTPInternalServerError()
+        return await handler(request)
+
+    def state(self) -> dict:
+        state = {"up": self.up}
+        state.update({category: list(values) for category, values in self.channels.items()})
+        state["temperature"] = dict(self.temperature)
+        if self.delta:
+            state["seq"] = self.seq
+        return state
+
+    def delta_since(self, since: str) -> dict | None:
+        """Channels changed after the since token, {} if none, None if the token is of no use."""
+        up = self.up
+        boot_id, _, number = since.partition("-")
+        if boot_id != f"{self.boot_id:08x}" or not number.isdigit() or int(number) > self.change_number:
+            return None
+        number = int(number)
+        if number == self.change_number:
+            return {}
+        if not self.changes or self.changes[0][0] > number + 1:
+            # the log no longer reaches back to the token
+            return None
+        delta: dict = {"since": since, "seq": self.seq, "up": up}
+        for change_number, category, key in self.changes:
+            if change_number > number:
+                values = self.temperature if category == "temperature" else self.channels[category]
+                delta.setdefault(category, {})[key] = (
+                    values.get(key) if category == "temperature" else values[int(key) - 1])
+        return delta
+
+    async def handle_system_info(self, request: web.Request) -> web.Response:
+        return web.json_response(self.system_info)
+
+    async def handle_state(self, request: web.Request) -> web.Response:
+        if self.delta and (since := request.query.get("since")):
+            delta = self.delta_since(since)
+            if delta == {}:
+                return web.Response(status=304)
+            if delta is not None:
+                return web.json_response(delta)
+        if self.binary and request.query.get("format") == "bin":
+            return web.Response(body=encode_binary_state(self.state()), content_type="application/octet-stream")
+        return web.json_response(self.state())
+
+    async def handle_write(self, request: web.Request) -> web.Response:
+        category = request.match_info["category"]
+        if category == "v_button":
+            return web.json_response({})
+        if category not in WRITABLE:
+            raise web.HTTPNotFound()
+        values = self.channels[category]
+        for idx, value in request.query.items():
+            if idx.isdigit() and 0 < int(idx) <= len(values) and value.lstrip("-").isdigit():
+                if values[int(idx) - 1] != int(value):
+                    values[int(idx) - 1] = int(value)
+                    self.changed(category, idx)
+        return web.json_response({category: list(values)} if self.echo else {})
+
+    def build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._inject])
+        app.router.add_get("/system_info", self.handle_system_info)
+        app.router.add_get("/state", self.handle_state)
+        app.router.add_post("/{category}", self.handle_write)
+        return app
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        if self.push_target:
+            loop = asyncio.get_running_loop()
+            self._push, _ = await loop.create_datagram_endpoint(
+                asyncio.DatagramProtocol, local_addr=(self.host, 0), remote_addr=self.push_target)
+
+    async def stop(self) -> None:
+        if self._push is not None:
+            self._push.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def set_input(self, category: str, idx: int, value: int) -> None:
+        """Change an input channel and push the edge."""
+        if self.channels[category][idx - 1] == value:
+            return
+        self.channels[category][idx - 1] = value
+        self.changed(category, f"{idx}")
+        if self._push is not None:
+            self._push.sendto(json.dumps({category: {str(idx): value}}).encode())
+
+    async def press(self, idx: int, long: bool = False, duration: float = 0.05) -> None:
+        """Short or long press of a wall button."""
+        category = "button_long" if long else "button"
+        if f"{category}_seq" in self.channels:
+            seq = self.channels[f"{category}_seq"]
+            seq[idx - 1] = (seq[idx - 1] + 1) & 0xFFFF
+            self.changed(f"{category}_seq", f"{idx}")
+        self.set_input(category, idx, 1)
+        await asyncio.sleep(duration)
+        self.set_input(category, idx, 0)
+
+
+async def _main(args: argparse.Namespace) -> None:
+    push_target = None
+    if args.push:
+        push_host, push_port = args.push.rsplit(":", 1)
+        push_target = (push_host, int(push_port))
+    controllers = [
+        FakeController(args.host, args.port + i, channels=args.channels, push_target=push_target, echo=args.echo,
+                       latency=args.latency / 1000, error_rate=args.error_rate, reboot_every=args.reboot_every,
+                       press_seq=not args.no_press_seq, delta=not args.no_delta, binary=not args.no_binary)
+        for i in range(args.count)
+    ]
+    for controller in controllers:
+        await controller.start()
+    print(f"ready: {args.count} fake controller(s) on http://{args.host}:{args.port}..{args.port + args.count - 1}",
+          flush=True)
+    while True:
+        await asyncio.sleep(args.press_every or 3600)
+        if args.press_every:
+            await random.choice(controllers).press(random.randint(1, args.channels), long=random.random() < 0.2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--count", type=int, default=1, help="number of controllers on consecutive ports")
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--push", help="host:port to send UDP push datagrams to")
+    parser.add_argument("--press-every", type=float, default=0, help="press a random button every N seconds")
+    parser.add_argument("--no-press-seq", action="store_true", help="old firmware without press sequence counters")
+    parser.add_argument("--no-delta", action="store_true", help="old firmware without /state?since=")
+    parser.add_argument("--no-binary", action="store_true", help="old firmware without /state?format=bin")
+    parser.add_argument("--echo", action="store_true", help="echo the written category in POST responses")
+    parser.add_argument("--latency", type=float, default=0, help="mean answer latency, ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--reboot-every", type=float, default=0, help="reboot every N seconds")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""Replay captured controller traffic through the coordinator.
+
+Feeds a capture written with the entry's "Record controller traffic" option
+(``<config>/stm32f103_homeassistant.<entry_id>.capture.jsonl`` and its
+rotated ``.1``..``.N`` parts) into a coordinator with the real platform
+entities, at the recorded pace or faster, and reports what the coordinator
+made of it: polls, failures, detected reboots, restores and state writes.
+``--profile`` prints where the CPU time of the decode and dispatch path
+goes. Requires Home Assistant to be installed::
+
+    python tools/replay.py capture.jsonl --speed 0 --profile
+
+At accelerated speeds only reboots that reset the uptime are detected
+reliably, as boot time drift is measured against the wall clock.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import cProfile
+import importlib
+import json
+import pstats
+import tempfile
+import time
+
+from benchmark import add_entities, import_integration
+
+
+async def replay(args: argparse.Namespace) -> dict:
+    from homeassistant.core import HomeAssistant
+
+    integration = import_integration()
+    capture = importlib.import_module(f"{integration.__name__}.capture")
+    records = capture.load_capture(args.capture)
+    if not records:
+        raise SystemExit(f"no records in {args.capture}")
+    device = capture.ReplayDevice(records, speed=args.speed)
+    hass = HomeAssistant(tempfile.mkdtemp())
+    coordinator = integration.STMDeviceDataUpdateCoordinator(hass, device, "127.0.0.1", None, {})
+    writes = 0
+
+    def count_write() -> None:
+        nonlocal writes
+        writes += 1
+
+    profiler = cProfile.Profile() if args.profile else None
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    await coordinator.async_refresh()
+    entities = await add_entities(hass, integration, coordinator, "replay", {}, count_write)
+    coordinator.desired_ready = True
+    failures = 0
+    if profiler is not None:
+        profiler.enable()
+    while not device.finished.is_set():
+        await coordinator.async_refresh()
+        if not coordinator.last_update_success:
+            failures += 1
+    if profiler is not None:
+        profiler.disable()
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    metrics = device.metrics
+    result = {
+        "records": len(records),
+        "entities": len(entities),
+        "replay_s": round(elapsed, 2),
+        "captured_s": round(records[-1]["ts"] - records[0]["ts"], 2),
+        "polls": metrics.polls,
+        "failed_polls": failures,
+        "cpu_ms_per_poll": round(cpu * 1000 / metrics.polls, 3) if metrics.polls else None,
+        "reboots": metrics.reboots,
+        "restores": metrics.restores,
+        "state_writes": writes,
+        "entities_notified": metrics.entities_notified,
+        "last_state": coordinator.data.as_dict() if coordinator.data is not None else None,
+    }
+    await device.close()
+    if profiler is not None:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.profile_lines)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", help="capture file written by the integration")
+    parser.add_argument("--speed", type=float, default=1, help="replay speed factor, 0 for as fast as possible")
+    parser.add_argument("--profile", action="store_true", help="profile the replayed polls")
+    parser.add_argument("--profile-lines", type=int, default=25)
+    print(json.dumps(asyncio.run(replay(parser.parse_args())), indent=2))